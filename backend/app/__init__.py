@@ -5,6 +5,13 @@ from flask_jwt_extended import JWTManager
 from flask_swagger_ui import get_swaggerui_blueprint
 from dotenv import load_dotenv
 from config import config
+from app.report_cache import ReportCache
+from app.report_jobs import ReportJobs
+from app.treatment_catalog import TreatmentCatalog
+from app.treatment_log_writer import TreatmentLogWriter
+from app.password_hasher import PasswordHasher
+from app.token_revocations import TokenRevocations
+from app.login_throttle import LoginThrottle
 import os
 
 load_dotenv()
@@ -12,6 +19,14 @@ load_dotenv()
 db = SQLAlchemy()
 migrate = Migrate()
 jwt = JWTManager()
+report_cache = ReportCache()
+report_jobs = ReportJobs()
+treatment_catalog = TreatmentCatalog()
+treatment_log_writer = TreatmentLogWriter()
+password_hasher = PasswordHasher()
+token_revocations = TokenRevocations()
+login_throttle = LoginThrottle()
+jwt.token_in_blocklist_loader(token_revocations.is_revoked)
 
 def create_app():
     app = Flask(__name__)
@@ -24,6 +39,13 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    report_cache.init_app(app)
+    report_jobs.init_app(app)
+    treatment_catalog.init_app(app)
+    treatment_log_writer.init_app(app)
+    password_hasher.init_app(app)
+    token_revocations.init_app(app)
+    login_throttle.init_app(app)
 
     from app.routes.auth_routes import auth_bp
     from app.routes.manager_routes import manager_bp
@@ -32,6 +54,7 @@ def create_app():
     from app.routes.report_routes import report_bp
     from app.routes.patient_routes import patients_bp
     from app.routes.treatment_routes import treatments_bp
+    from app.routes.user_routes import users_bp
 
     SWAGGER_URL = "/api/docs"
     API_URL = "/static/swagger.yaml"
@@ -45,5 +68,17 @@ def create_app():
     app.register_blueprint(report_bp, url_prefix='/api/reports')
     app.register_blueprint(patients_bp, url_prefix="/api/patients")
     app.register_blueprint(treatments_bp, url_prefix="/api/treatments")
+    app.register_blueprint(users_bp, url_prefix="/api/users")
+
+    from app.statistics import rebuild_statistics_command
+    app.cli.add_command(rebuild_statistics_command)
+    from app.log_partitions import partition_treatment_logs_command
+    app.cli.add_command(partition_treatment_logs_command)
+    from app.archive import archive_patient_treatments_command
+    app.cli.add_command(archive_patient_treatments_command)
+    from app.password_hasher import benchmark_password_hashing_command
+    app.cli.add_command(benchmark_password_hashing_command)
+    from app.staff_import import import_staff_command
+    app.cli.add_command(import_staff_command)
 
     return app
\ No newline at end of file
@@ -0,0 +1,50 @@
+import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select, delete
+from app.models import PatientTreatment, PatientTreatmentArchive, ensure_patient_treatments_all_view
+from app import db
+
+ARCHIVED_COLUMNS = ('id', 'patient_id', 'treatment_id', 'prescribed_by', 'applied_by', 'prescribed_at', 'applied_at', 'status')
+
+def archive_applied_treatments(older_than_days, batch_size):
+    # Moves applied patient_treatments rows whose applied_at is older than `older_than_days` into
+    # patient_treatments_archive, `batch_size` rows per transaction so locks stay short.
+    # The summary statistics are untouched: archived rows still count. Returns the rows moved.
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        ids = db.session.execute(
+            select(PatientTreatment.id)
+            .where(PatientTreatment.status == 'applied', PatientTreatment.applied_at < cutoff)
+            .order_by(PatientTreatment.id)
+            .limit(batch_size)
+            .with_for_update()
+        ).scalars().all()
+        if not ids:
+            return moved
+
+        columns = [getattr(PatientTreatment, name) for name in ARCHIVED_COLUMNS]
+        db.session.execute(
+            insert(PatientTreatmentArchive).from_select(
+                list(ARCHIVED_COLUMNS), select(*columns).where(PatientTreatment.id.in_(ids))
+            )
+        )
+        db.session.execute(delete(PatientTreatment).where(PatientTreatment.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+
+@click.command('archive-patient-treatments')
+@click.option('--older-than-days', type=int, default=None, help='Archive rows applied more than this many days ago.')
+@click.option('--batch-size', type=int, default=None, help='Rows moved per transaction.')
+@with_appcontext
+def archive_patient_treatments_command(older_than_days, batch_size):
+    """Move old applied patient treatments into patient_treatments_archive."""
+    if older_than_days is None:
+        older_than_days = current_app.config.get('PATIENT_TREATMENT_ARCHIVE_AFTER_DAYS', 180)
+    if batch_size is None:
+        batch_size = current_app.config.get('PATIENT_TREATMENT_ARCHIVE_BATCH_SIZE', 1000)
+    ensure_patient_treatments_all_view()
+    moved = archive_applied_treatments(older_than_days, batch_size)
+    click.echo(f'{moved} patient treatment(s) archived.')
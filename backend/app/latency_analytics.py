@@ -0,0 +1,151 @@
+import numpy as np
+from sqlalchemy import func, select, literal
+from app.models import patient_treatments_all, ensure_patient_treatments_all_view
+from app.statistics import apply_latency_expression
+from app import db
+
+# Archived rows count like the report statistics do, so rows are read through the
+# patient_treatments_all view (hot and archived rows combined).
+TREATMENTS = patient_treatments_all.c
+
+GROUP_COLUMNS = {
+    'treatment': TREATMENTS.treatment_id,
+    'assistant': TREATMENTS.applied_by,
+    'doctor': TREATMENTS.prescribed_by
+}
+
+DEFAULT_BIN_EDGES_HOURS = [0, 1, 2, 4, 8, 12, 24, 48, 72, 168]
+QUANTILES = (('p50_hours', 0.50), ('p90_hours', 0.90), ('p99_hours', 0.99))
+
+# Quantiles are read from a fixed log-scaled histogram (1 s .. ~10 years, ~2% bin width) that is
+# accumulated chunk by chunk, so memory depends on the number of groups and not on the row count.
+FINE_BINS = 1024
+FINE_MAX_SECONDS = 10 * 365 * 24 * 3600
+FINE_EDGES = np.concatenate(([0.0], np.geomspace(1.0, FINE_MAX_SECONDS, FINE_BINS)))
+
+def _fine_bin_index(seconds):
+    index = np.searchsorted(FINE_EDGES, seconds, side='right') - 1
+    return np.clip(index, 0, FINE_BINS - 1)
+
+class _Accumulator:
+    # Per-group counters: fine histogram (quantiles), coarse histogram (response) and sums (mean).
+
+    def __init__(self, coarse_edges_seconds):
+        self.coarse_edges = coarse_edges_seconds
+        self.coarse_bins = len(coarse_edges_seconds)
+        self.group_ids = []
+        self.group_rows = {}
+        self.fine = np.zeros((0, FINE_BINS), dtype=np.int64)
+        self.coarse = np.zeros((0, self.coarse_bins), dtype=np.int64)
+        self.sums = np.zeros(0, dtype=np.float64)
+
+    def _rows_for(self, unique_groups):
+        new_groups = [g for g in unique_groups.tolist() if g not in self.group_rows]
+        if new_groups:
+            for g in new_groups:
+                self.group_rows[g] = len(self.group_ids)
+                self.group_ids.append(g)
+            extra = len(new_groups)
+            self.fine = np.vstack((self.fine, np.zeros((extra, FINE_BINS), dtype=np.int64)))
+            self.coarse = np.vstack((self.coarse, np.zeros((extra, self.coarse_bins), dtype=np.int64)))
+            self.sums = np.concatenate((self.sums, np.zeros(extra, dtype=np.float64)))
+        return np.array([self.group_rows[g] for g in unique_groups.tolist()], dtype=np.int64)
+
+    def add(self, groups, seconds):
+        unique_groups, inverse = np.unique(groups, return_inverse=True)
+        rows = self._rows_for(unique_groups)[inverse]
+        size = len(self.group_ids)
+
+        fine_index = rows * FINE_BINS + _fine_bin_index(seconds)
+        self.fine += np.bincount(fine_index, minlength=size * FINE_BINS).reshape(size, FINE_BINS)
+
+        coarse_bin = np.searchsorted(self.coarse_edges, seconds, side='right') - 1
+        coarse_index = rows * self.coarse_bins + coarse_bin
+        self.coarse += np.bincount(coarse_index, minlength=size * self.coarse_bins).reshape(size, self.coarse_bins)
+
+        self.sums += np.bincount(rows, weights=seconds, minlength=size)
+
+def _quantiles(fine):
+    # Vectorised quantile lookup over all groups, interpolating linearly inside the selected bin.
+    totals = fine.sum(axis=1)
+    cumulative = np.cumsum(fine, axis=1)
+    lower_edges = FINE_EDGES[:-1]
+    upper_edges = FINE_EDGES[1:]
+    result = {}
+    for name, q in QUANTILES:
+        target = np.maximum(np.ceil(q * totals), 1)
+        index = np.minimum((cumulative < target[:, None]).sum(axis=1), FINE_BINS - 1)
+        rows = np.arange(len(totals))
+        before = np.where(index > 0, cumulative[rows, np.maximum(index - 1, 0)], 0)
+        in_bin = np.maximum(fine[rows, index], 1)
+        fraction = np.clip((target - before) / in_bin, 0, 1)
+        seconds = lower_edges[index] + fraction * (upper_edges[index] - lower_edges[index])
+        result[name] = seconds / 3600
+    return result
+
+def _summaries(fine, coarse, sums, edges_hours):
+    counts = fine.sum(axis=1)
+    quantiles = _quantiles(fine)
+    summaries = []
+    for row, count in enumerate(counts.tolist()):
+        histogram = []
+        for i, edge in enumerate(edges_hours):
+            histogram.append({
+                'from_hours': edge,
+                'to_hours': edges_hours[i + 1] if i + 1 < len(edges_hours) else None,
+                'count': int(coarse[row, i])
+            })
+        summaries.append({
+            'count': count,
+            'mean_hours': round(float(sums[row]) / count / 3600, 2) if count else 0,
+            'p50_hours': round(float(quantiles['p50_hours'][row]), 2) if count else 0,
+            'p90_hours': round(float(quantiles['p90_hours'][row]), 2) if count else 0,
+            'p99_hours': round(float(quantiles['p99_hours'][row]), 2) if count else 0,
+            'histogram': histogram
+        })
+    return summaries
+
+def compute_apply_latency_distribution(group_by=None, bin_edges_hours=None, chunk_size=100000):
+    # Streams (group, latency in seconds) pairs of applied treatments, archived ones included, from
+    # a server-side cursor and folds each chunk into NumPy histograms; no ORM objects are built.
+    edges_hours = sorted(bin_edges_hours or DEFAULT_BIN_EDGES_HOURS)
+    if edges_hours[0] != 0:
+        edges_hours = [0] + edges_hours
+    coarse_edges_seconds = np.array(edges_hours, dtype=np.float64) * 3600
+
+    ensure_patient_treatments_all_view()
+    latency = apply_latency_expression('SECOND', TREATMENTS)
+    group_column = func.coalesce(GROUP_COLUMNS[group_by], 0) if group_by else literal(0)
+    query = (
+        select(group_column, latency)
+        .where(TREATMENTS.applied_at.isnot(None), TREATMENTS.prescribed_at.isnot(None))
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+
+    accumulator = _Accumulator(coarse_edges_seconds)
+    result = db.session.execute(query)
+    for chunk in result.partitions(chunk_size):
+        pairs = np.array(chunk, dtype=np.int64).reshape(-1, 2)
+        accumulator.add(pairs[:, 0], np.maximum(pairs[:, 1], 0).astype(np.float64))
+
+    group_ids = accumulator.group_ids
+    summaries = _summaries(accumulator.fine, accumulator.coarse, accumulator.sums, edges_hours)
+
+    overall = _summaries(
+        accumulator.fine.sum(axis=0, keepdims=True),
+        accumulator.coarse.sum(axis=0, keepdims=True),
+        np.array([accumulator.sums.sum()]),
+        edges_hours
+    )[0]
+
+    response = {
+        'group_by': group_by,
+        'bin_edges_hours': edges_hours,
+        'overall': overall
+    }
+    if group_by:
+        groups = []
+        for group_id, summary in sorted(zip(group_ids, summaries), key=lambda item: item[0]):
+            groups.append({f'{group_by}_id': group_id or None, **summary})
+        response['groups'] = groups
+    return response
@@ -0,0 +1,125 @@
+import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.sql import text
+from app import db
+
+TABLE = 'treatment_logs'
+CATCH_ALL = 'pmax'
+
+# MySQL only. Partitioned InnoDB tables cannot have foreign keys and every unique key must contain
+# the partition column, so partitioning drops the foreign keys of treatment_logs (the API already
+# deletes and detaches log rows explicitly, see delete_user_references and the delete routes) and
+# widens the primary key to (id, applied_at).
+
+def _month_start(value):
+    return datetime.datetime(value.year, value.month, 1)
+
+def _next_month(value):
+    return datetime.datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+def _partition_name(month_start):
+    # Partition p202501 holds the rows applied in January 2025.
+    return f'p{month_start:%Y%m}'
+
+def _partition_clause(month_start):
+    return (
+        f"PARTITION {_partition_name(month_start)} VALUES LESS THAN "
+        f"(UNIX_TIMESTAMP('{_next_month(month_start):%Y-%m-%d %H:%M:%S}'))"
+    )
+
+def _existing_partitions():
+    # Returns the names of the monthly partitions, oldest first (empty if not partitioned).
+    rows = db.session.execute(text(
+        "SELECT partition_name FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = :table AND partition_name IS NOT NULL "
+        "ORDER BY partition_ordinal_position"
+    ), {'table': TABLE}).scalars().all()
+    return [name for name in rows if name != CATCH_ALL]
+
+def _months(first, last):
+    month = _month_start(first)
+    while month <= last:
+        yield month
+        month = _next_month(month)
+
+def partition_treatment_logs(months_ahead):
+    # Converts treatment_logs to monthly RANGE partitions, from its oldest row up to `months_ahead`
+    # months after the current one, plus a catch-all partition.
+    if db.session.execute(text(f'SELECT COUNT(*) FROM {TABLE} WHERE applied_at IS NULL')).scalar():
+        raise click.ClickException('treatment_logs has rows without applied_at; set it before partitioning.')
+
+    oldest = db.session.execute(text(f'SELECT MIN(applied_at) FROM {TABLE}')).scalar() or datetime.datetime.now()
+    last = _month_start(datetime.datetime.now())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+
+    foreign_keys = db.session.execute(text(
+        "SELECT constraint_name FROM information_schema.referential_constraints "
+        "WHERE constraint_schema = DATABASE() AND table_name = :table"
+    ), {'table': TABLE}).scalars().all()
+    for name in foreign_keys:
+        db.session.execute(text(f'ALTER TABLE {TABLE} DROP FOREIGN KEY `{name}`'))
+
+    partitions = [_partition_clause(month) for month in _months(oldest, last)]
+    partitions.append(f'PARTITION {CATCH_ALL} VALUES LESS THAN MAXVALUE')
+    db.session.execute(text(
+        f'ALTER TABLE {TABLE} '
+        'MODIFY applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, '
+        'DROP PRIMARY KEY, ADD PRIMARY KEY (id, applied_at) '
+        'PARTITION BY RANGE (UNIX_TIMESTAMP(applied_at)) (' + ', '.join(partitions) + ')'
+    ))
+    return len(partitions) - 1
+
+def add_future_partitions(existing, months_ahead):
+    # Splits the catch-all partition so every month up to `months_ahead` has its own partition.
+    last = _month_start(datetime.datetime.now())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    newest = datetime.datetime.strptime(existing[-1][1:], '%Y%m')
+    months = list(_months(_next_month(newest), last))
+    if not months:
+        return 0
+    partitions = [_partition_clause(month) for month in months]
+    partitions.append(f'PARTITION {CATCH_ALL} VALUES LESS THAN MAXVALUE')
+    db.session.execute(text(
+        f'ALTER TABLE {TABLE} REORGANIZE PARTITION {CATCH_ALL} INTO (' + ', '.join(partitions) + ')'
+    ))
+    return len(months)
+
+def drop_partitions_before(existing, month):
+    # Drops the partitions holding rows applied before `month`. Much cheaper than a DELETE.
+    expired = [name for name in existing if datetime.datetime.strptime(name[1:], '%Y%m') < month]
+    if expired:
+        db.session.execute(text(f'ALTER TABLE {TABLE} DROP PARTITION ' + ', '.join(expired)))
+    return expired
+
+@click.command('partition-treatment-logs')
+@click.option('--months-ahead', default=3, show_default=True, help='Future months to create partitions for.')
+@click.option('--drop-before', default=None, metavar='YYYY-MM', help='Drop the partitions of months before this one.')
+@with_appcontext
+def partition_treatment_logs_command(months_ahead, drop_before):
+    """Partition treatment_logs by month (MySQL) and maintain its partitions."""
+    if db.engine.dialect.name != 'mysql':
+        raise click.ClickException('Partitioning treatment_logs is only supported on MySQL.')
+
+    drop_month = None
+    if drop_before:
+        try:
+            drop_month = datetime.datetime.strptime(drop_before, '%Y-%m')
+        except ValueError:
+            raise click.ClickException('--drop-before must be formatted as YYYY-MM.')
+
+    existing = _existing_partitions()
+    if not existing:
+        created = partition_treatment_logs(months_ahead)
+        click.echo(f'treatment_logs partitioned into {created} monthly partitions.')
+        existing = _existing_partitions()
+    else:
+        created = add_future_partitions(existing, months_ahead)
+        click.echo(f'{created} partition(s) added.')
+
+    if drop_month is not None:
+        dropped = drop_partitions_before(existing, drop_month)
+        click.echo(f'{len(dropped)} partition(s) dropped: {", ".join(dropped) or "none"}.')
+    db.session.commit()
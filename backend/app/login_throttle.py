@@ -0,0 +1,172 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import func, insert, select, update, delete
+
+def bucket_key(kind, value):
+    # Fixed-size key whatever the length of the submitted name: "<kind>:<sha256 hex>" (69 chars).
+    return f'{kind}:{hashlib.sha256(str(value).encode()).hexdigest()}'
+
+class MemoryBuckets:
+    # Token buckets of one worker. Entries are kept in least recently updated order; an entry idle
+    # long enough to be full again is equivalent to no entry, so it is dropped from the front on
+    # every call. Memory is O(1) per active key and bounded by max_keys.
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, limits, now):
+        # limits: [(key, capacity, refill_per_second)]. Takes one token from every bucket if all
+        # have one; otherwise takes nothing and returns the seconds until they would.
+        with self._lock:
+            self._expire(limits, now)
+            levels = []
+            for key, capacity, rate in limits:
+                tokens, updated_at = self._buckets.get(key, (capacity, now))
+                levels.append(min(capacity, tokens + (now - updated_at) * rate))
+            wait = max(((1 - level) / rate for level, (_, _, rate) in zip(levels, limits) if level < 1), default=0)
+            if wait:
+                return wait
+            for level, (key, _, _) in zip(levels, limits):
+                self._buckets[key] = (level - 1, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0
+
+    def refund(self, limits):
+        # Gives back the token taken from each bucket.
+        with self._lock:
+            for key, capacity, _ in limits:
+                if key in self._buckets:
+                    tokens, updated_at = self._buckets[key]
+                    self._buckets[key] = (min(capacity, tokens + 1), updated_at)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def _expire(self, limits, now):
+        idle_limit = max(capacity / rate for _, capacity, rate in limits)
+        while self._buckets:
+            _, (_, updated_at) = next(iter(self._buckets.items()))
+            if now - updated_at < idle_limit:
+                break
+            self._buckets.popitem(last=False)
+
+class DatabaseBuckets:
+    # Token buckets in the login_throttle_buckets table so limits hold across workers. Each bucket
+    # is refilled and decremented by one conditional UPDATE (a missing bucket is inserted) in a
+    # short transaction of its own, rolled back when any bucket is empty. Rows idle long enough to
+    # be full again are deleted at most every `purge_seconds` per worker.
+
+    def __init__(self, purge_seconds=60):
+        self.purge_seconds = purge_seconds
+        self._purged_at = 0
+
+    def take(self, limits, now):
+        from app import db
+        from app.models import LoginThrottleBucket as Bucket
+        least = func.min if db.engine.dialect.name == 'sqlite' else func.least
+        wait = 0
+        with db.engine.connect() as connection:
+            transaction = connection.begin()
+            for key, capacity, rate in limits:
+                level = least(capacity, Bucket.tokens + (now - Bucket.updated_at) * rate)
+                take_token = update(Bucket).where(Bucket.key == key, level >= 1).values(tokens=level - 1, updated_at=now)
+                taken = connection.execute(take_token).rowcount
+                if not taken:
+                    taken = connection.execute(
+                        insert(Bucket)
+                        .prefix_with('IGNORE', dialect='mysql')
+                        .prefix_with('OR IGNORE', dialect='sqlite')
+                        .values(key=key, tokens=capacity - 1, updated_at=now)
+                    ).rowcount
+                if not taken:
+                    # Another worker inserted the bucket first: take the token from its row.
+                    taken = connection.execute(take_token).rowcount
+                if not taken:
+                    # The bucket exists and is empty.
+                    tokens, updated_at = connection.execute(
+                        select(Bucket.tokens, Bucket.updated_at).where(Bucket.key == key)
+                    ).one()
+                    wait = max(wait, (1 - min(capacity, tokens + (now - updated_at) * rate)) / rate)
+            if wait:
+                transaction.rollback()
+                return wait
+            if now - self._purged_at >= self.purge_seconds:
+                idle_limit = max(capacity / rate for _, capacity, rate in limits)
+                connection.execute(delete(Bucket).where(Bucket.updated_at < now - idle_limit))
+                self._purged_at = now
+            transaction.commit()
+        return 0
+
+    def refund(self, limits):
+        # Gives back the token taken from each bucket.
+        from app import db
+        from app.models import LoginThrottleBucket as Bucket
+        least = func.min if db.engine.dialect.name == 'sqlite' else func.least
+        with db.engine.begin() as connection:
+            for key, capacity, _ in limits:
+                connection.execute(update(Bucket).where(Bucket.key == key).values(tokens=least(capacity, Bucket.tokens + 1)))
+
+    def clear(self):
+        from app import db
+        from app.models import LoginThrottleBucket
+        LoginThrottleBucket.query.delete()
+        db.session.commit()
+
+class LoginThrottle:
+    # Token-bucket limiter for /api/auth/login, checked before the user lookup and the password
+    # hash. Every attempt takes a token from the bucket of its username and from the bucket of its
+    # client address, and a successful login gives them back: only failed attempts are charged,
+    # so a shift change behind one kiosk address is not throttled while guessing is.
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.user_capacity = 5
+        self.user_refill_per_second = 0.1
+        self.address_capacity = 50
+        self.address_refill_per_second = 1.0
+        self.backend = MemoryBuckets(100000)
+        self.rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LOGIN_THROTTLE_ENABLED', self.enabled)
+        self.user_capacity = app.config.get('LOGIN_THROTTLE_USER_CAPACITY', self.user_capacity)
+        self.user_refill_per_second = app.config.get('LOGIN_THROTTLE_USER_REFILL_PER_SECOND', self.user_refill_per_second)
+        self.address_capacity = app.config.get('LOGIN_THROTTLE_ADDRESS_CAPACITY', self.address_capacity)
+        self.address_refill_per_second = app.config.get('LOGIN_THROTTLE_ADDRESS_REFILL_PER_SECOND', self.address_refill_per_second)
+        if app.config.get('LOGIN_THROTTLE_BACKEND', 'memory') == 'database':
+            self.backend = DatabaseBuckets()
+        else:
+            self.backend = MemoryBuckets(app.config.get('LOGIN_THROTTLE_MAX_KEYS', 100000))
+        self.rejected = 0
+
+    def check(self, name, address):
+        # Returns 0 when the attempt may proceed, otherwise the whole seconds to wait.
+        if not self.enabled:
+            return 0
+        wait = self.backend.take(self._limits(name, address), time.time())
+        if wait:
+            self.rejected += 1
+            return max(1, math.ceil(wait))
+        return 0
+
+    def refund(self, name, address):
+        # Call after a successful login (or one that never reached the password check) that
+        # passed check(): gives back its tokens.
+        if self.enabled:
+            self.backend.refund(self._limits(name, address))
+
+    def _limits(self, name, address):
+        return [
+            (bucket_key('user', name.lower()), self.user_capacity, self.user_refill_per_second),
+            (bucket_key('addr', address), self.address_capacity, self.address_refill_per_second)
+        ]
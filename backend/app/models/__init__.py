@@ -4,3 +4,11 @@ from app.models.treatment import Treatment
 from app.models.patient_treatment import PatientTreatment
 from app.models.patient_assistant import PatientAssistant
 from app.models.treatment_log import TreatmentLog
+from app.models.treatment_statistic import TreatmentStatistic
+from app.models.assistant_statistic import AssistantStatistic
+from app.models.apply_latency_statistic import ApplyLatencyStatistic
+from app.models.catalog_version import CatalogVersion
+from app.models.patient_treatment_archive import PatientTreatmentArchive, patient_treatments_all, ensure_patient_treatments_all_view
+from app.models.revoked_token import RevokedToken
+from app.models.login_throttle_bucket import LoginThrottleBucket
+from app.models.user_token_cutoff import UserTokenCutoff
@@ -0,0 +1,10 @@
+from app import db
+
+class ApplyLatencyStatistic(db.Model):
+    __tablename__ = 'apply_latency_statistics'
+
+    # Running sum and count of prescribed_at -> applied_at hours, spread over
+    # statistics.LATENCY_SHARDS rows (id 0..LATENCY_SHARDS - 1); the totals are their sum.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_hours = db.Column(db.BigInteger, nullable=False, default=0)
+    applied_count = db.Column(db.BigInteger, nullable=False, default=0)
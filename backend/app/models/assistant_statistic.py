@@ -0,0 +1,10 @@
+from app import db
+from app.models.user import User
+
+class AssistantStatistic(db.Model):
+    __tablename__ = 'assistant_statistics'
+
+    assistant_id = db.Column(db.BigInteger, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    patients_assigned = db.Column(db.BigInteger, nullable=False, default=0, index=True)
+
+    assistant = db.relationship('User')
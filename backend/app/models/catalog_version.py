@@ -0,0 +1,9 @@
+from app import db
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_versions'
+
+    # One row per cached catalog; writers bump the version so every worker can detect changes
+    # with a primary key lookup.
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
@@ -0,0 +1,11 @@
+from app import db
+
+class LoginThrottleBucket(db.Model):
+    __tablename__ = 'login_throttle_buckets'
+
+    # Token buckets of the login throttle when LOGIN_THROTTLE_BACKEND = 'database', shared by all
+    # workers. key is "user:" or "addr:" plus a SHA-256 hex digest (see bucket_key). updated_at
+    # is a Unix timestamp; rows idle long enough to be full again are deleted.
+    key = db.Column(db.String(69), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
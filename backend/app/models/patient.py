@@ -2,6 +2,13 @@ from app import db
 
 class Patient(db.Model):
     __tablename__ = 'patients'
+    __table_args__ = (
+        # Name search: the B-tree index on name serves case-insensitive prefix matches on MySQL
+        # (_ci collation); the ngram FULLTEXT index serves ranked matches anywhere in the name.
+        # SQLite gets a NOCASE index instead so LIKE 'prefix%' can use it.
+        db.Index('ix_patients_name_fulltext', 'name', mysql_prefix='FULLTEXT', mysql_with_parser='ngram').ddl_if(dialect='mysql'),
+        db.Index('ix_patients_name_nocase', db.text('name COLLATE NOCASE')).ddl_if(dialect='sqlite'),
+    )
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    name = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(255), nullable=False, index=True)
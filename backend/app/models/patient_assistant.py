@@ -4,6 +4,9 @@ from app.models.patient import Patient
 
 class PatientAssistant(db.Model):
     __tablename__ = 'patient_assistants'
+    __table_args__ = (
+        db.Index('ix_patient_assistants_doctor_patient', 'doctor_id', 'patient_id'),
+    )
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     patient_id = db.Column(db.BigInteger,db.ForeignKey('patients.id', ondelete='CASCADE'),nullable=True)
@@ -11,5 +14,5 @@ class PatientAssistant(db.Model):
     doctor_id = db.Column(db.BigInteger, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
 
     patient = db.relationship('Patient', backref='patient_assistants', passive_deletes=True)
-    assistant = db.relationship('User', foreign_keys=[assistant_id],backref='assisting_patients')
-    supervising_doctor = db.relationship('User', foreign_keys=[doctor_id], backref='assigned_assistants')
\ No newline at end of file
+    assistant = db.relationship('User', foreign_keys=[assistant_id], backref=db.backref('assisting_patients', passive_deletes=True))
+    supervising_doctor = db.relationship('User', foreign_keys=[doctor_id], backref=db.backref('assigned_assistants', passive_deletes=True))
\ No newline at end of file
@@ -5,6 +5,10 @@ from app.models.treatment import Treatment
 
 class PatientTreatment(db.Model):
     __tablename__ = 'patient_treatments'
+    __table_args__ = (
+        db.Index('ix_patient_treatments_patient_treatment', 'patient_id', 'treatment_id'),
+        db.Index('ix_patient_treatments_status_applied_at', 'status', 'applied_at'),
+    )
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     patient_id = db.Column(db.BigInteger, db.ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
@@ -16,6 +20,6 @@ class PatientTreatment(db.Model):
     status = db.Column(db.Enum('prescribed', 'applied', name='status_enum'), default='prescribed')
 
     patient = db.relationship('Patient', backref=db.backref('patient_treatments', passive_deletes=True))
-    treatment = db.relationship('Treatment', backref='patient_treatments')
-    prescribing_doctor = db.relationship('User', foreign_keys=[prescribed_by], backref='prescribed_treatments')
-    applying_assistant = db.relationship('User', foreign_keys=[applied_by], backref='applied_treatments')
+    treatment = db.relationship('Treatment', backref=db.backref('patient_treatments', passive_deletes=True))
+    prescribing_doctor = db.relationship('User', foreign_keys=[prescribed_by], backref=db.backref('prescribed_treatments', passive_deletes=True))
+    applying_assistant = db.relationship('User', foreign_keys=[applied_by], backref=db.backref('applied_treatments', passive_deletes=True))
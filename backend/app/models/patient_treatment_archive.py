@@ -0,0 +1,69 @@
+from sqlalchemy import event, inspect, DDL, MetaData
+from app import db
+
+class PatientTreatmentArchive(db.Model):
+    __tablename__ = 'patient_treatments_archive'
+    __table_args__ = (
+        db.Index('ix_patient_treatments_archive_patient_treatment', 'patient_id', 'treatment_id'),
+    )
+
+    # Applied patient_treatments rows moved out of the hot table by `flask archive-patient-treatments`.
+    # Rows keep their original id.
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    patient_id = db.Column(db.BigInteger, db.ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
+    treatment_id = db.Column(db.BigInteger, db.ForeignKey('treatments.id', ondelete='CASCADE'), nullable=False)
+    prescribed_by = db.Column(db.BigInteger, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    applied_by = db.Column(db.BigInteger, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    prescribed_at = db.Column(db.DateTime, nullable=True)
+    applied_at = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.Enum('prescribed', 'applied', name='status_enum'), default='applied')
+    archived_at = db.Column(db.DateTime, nullable=False, server_default=db.func.current_timestamp())
+
+# Read-only union of the hot and archived rows, used by reports that ask for archived history.
+# It lives outside db.metadata so create_all does not create it as a table; the view itself is
+# created and dropped together with the tables.
+PATIENT_TREATMENTS_ALL_VIEW = 'patient_treatments_all'
+
+patient_treatments_all = db.Table(
+    PATIENT_TREATMENTS_ALL_VIEW,
+    MetaData(),
+    db.Column('id', db.BigInteger, primary_key=True),
+    db.Column('patient_id', db.BigInteger),
+    db.Column('treatment_id', db.BigInteger),
+    db.Column('prescribed_by', db.BigInteger),
+    db.Column('applied_by', db.BigInteger),
+    db.Column('prescribed_at', db.DateTime),
+    db.Column('applied_at', db.DateTime),
+    db.Column('status', db.String(20)),
+    db.Column('archived', db.Boolean)
+)
+
+_VIEW_COLUMNS = 'id, patient_id, treatment_id, prescribed_by, applied_by, prescribed_at, applied_at, status'
+
+_VIEW_SELECT = (
+    f'SELECT {_VIEW_COLUMNS}, 0 AS archived FROM patient_treatments '
+    f'UNION ALL SELECT {_VIEW_COLUMNS}, 1 AS archived FROM patient_treatments_archive'
+)
+
+_CREATE_VIEW = {
+    'mysql': f'CREATE OR REPLACE VIEW {PATIENT_TREATMENTS_ALL_VIEW} AS {_VIEW_SELECT}',
+    'sqlite': f'CREATE VIEW IF NOT EXISTS {PATIENT_TREATMENTS_ALL_VIEW} AS {_VIEW_SELECT}'
+}
+
+for _dialect, _statement in _CREATE_VIEW.items():
+    event.listen(db.metadata, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+event.listen(db.metadata, 'before_drop', DDL(f'DROP VIEW IF EXISTS {PATIENT_TREATMENTS_ALL_VIEW}'))
+
+_view_checked = False
+
+def ensure_patient_treatments_all_view():
+    # Migrations generated by `flask db migrate` never contain views, so databases built with
+    # `flask db upgrade` get the view here: once per process, before it is first read, and from
+    # `flask archive-patient-treatments`. Both CREATE statements are idempotent.
+    global _view_checked
+    if _view_checked:
+        return
+    with db.engine.begin() as connection:
+        if PATIENT_TREATMENTS_ALL_VIEW not in inspect(connection).get_view_names():
+            connection.exec_driver_sql(_CREATE_VIEW[connection.dialect.name])
+    _view_checked = True
@@ -0,0 +1,11 @@
+from app import db
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    # JTIs of revoked JWTs, kept until the token would have expired anyway. Workers mirror this
+    # table in memory (see app/token_revocations.py), reloading its unexpired rows periodically.
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(36), nullable=False, unique=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
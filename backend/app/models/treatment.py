@@ -5,4 +5,5 @@ class Treatment(db.Model):
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     name = db.Column(db.String(255), nullable=False)
-    description = db.Column(db.Text, nullable=False)
+    # Unbounded text, only loaded when accessed or requested (see the ?fields= list parameter).
+    description = db.deferred(db.Column(db.Text, nullable=False))
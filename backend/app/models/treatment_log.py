@@ -5,14 +5,20 @@ from app.models.treatment import Treatment
 
 class TreatmentLog(db.Model):
     __tablename__ = 'treatment_logs'
+    __table_args__ = (
+        # Range queries by patient or assistant over a time window, and by time window alone.
+        db.Index('ix_treatment_logs_patient_applied_at', 'patient_id', 'applied_at'),
+        db.Index('ix_treatment_logs_applied_by_applied_at', 'applied_by', 'applied_at'),
+        db.Index('ix_treatment_logs_applied_at', 'applied_at'),
+    )
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     patient_id = db.Column(db.BigInteger, db.ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
     treatment_id = db.Column(db.BigInteger, db.ForeignKey('treatments.id', ondelete='CASCADE'), nullable=False)
     applied_by = db.Column(db.BigInteger, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
     applied_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), nullable=True)
-    notes = db.Column(db.Text, nullable=True)
+    notes = db.deferred(db.Column(db.Text, nullable=True))
 
-    patient = db.relationship('Patient', backref='treatment_logs')
-    treatment = db.relationship('Treatment', backref='treatment_logs')
-    applying_assistant = db.relationship('User', foreign_keys=[applied_by], backref='treatment_logs')
+    patient = db.relationship('Patient', backref=db.backref('treatment_logs', passive_deletes=True))
+    treatment = db.relationship('Treatment', backref=db.backref('treatment_logs', passive_deletes=True))
+    applying_assistant = db.relationship('User', foreign_keys=[applied_by], backref=db.backref('treatment_logs', passive_deletes=True))
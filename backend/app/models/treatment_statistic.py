@@ -0,0 +1,10 @@
+from app import db
+from app.models.treatment import Treatment
+
+class TreatmentStatistic(db.Model):
+    __tablename__ = 'treatment_statistics'
+
+    treatment_id = db.Column(db.BigInteger, db.ForeignKey('treatments.id', ondelete='CASCADE'), primary_key=True)
+    times_prescribed = db.Column(db.BigInteger, nullable=False, default=0, index=True)
+
+    treatment = db.relationship('Treatment')
@@ -1,8 +1,13 @@
-from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app import db, password_hasher
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Names are unique logins. (role, name) serves the role-filtered directory: role equality,
+        # name prefix and the name keyset cursor are all one index range, already in name order.
+        db.Index('ix_users_name', 'name', unique=True),
+        db.Index('ix_users_role_name', 'role', 'name', unique=True),
+    )
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     name = db.Column(db.String(255), nullable=False)
@@ -10,7 +15,8 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Raises PasswordHasherBusy when the hashing pool is full; routes answer it with a 503.
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
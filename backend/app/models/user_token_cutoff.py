@@ -0,0 +1,12 @@
+from app import db
+
+class UserTokenCutoff(db.Model):
+    __tablename__ = 'user_token_cutoffs'
+
+    # Tokens of the user issued before not_before are rejected (user deleted, role or password
+    # changed). No foreign key: the row must outlive a deleted user. Kept until expires_at, when
+    # every token issued before the cutoff has expired anyway. Mirrored in memory with
+    # revoked_tokens (see app/token_revocations.py).
+    user_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    not_before = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
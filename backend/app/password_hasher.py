@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import click
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    # Runs password hashing and verification on a bounded process pool so the CPU-bound KDF does
+    # not hold request workers (or the GIL). Hash parameters come from the config; hashes made with
+    # other parameters are reported by needs_rehash so they can be upgraded after a login.
+    # PASSWORD_HASH_WORKERS = 0 hashes inline on the calling thread. Batches (hash_many) run on a
+    # separate pool of PASSWORD_HASH_BULK_WORKERS processes so a large import never queues ahead
+    # of interactive logins.
+
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.salt_length = 16
+        self.workers = os.cpu_count() or 1
+        self.max_pending = 64
+        self.bulk_workers = max(1, self.workers // 2)
+        self._executor = None
+        self._bulk_executor = None
+        self._pending = 0
+        self._current_prefix = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = app.config.get('PASSWORD_HASH_SALT_LENGTH', self.salt_length)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.bulk_workers = app.config.get('PASSWORD_HASH_BULK_WORKERS', max(1, self.workers // 2))
+        self._current_prefix = None
+
+    def hash(self, password):
+        return self._call(generate_password_hash, password, self.method, self.salt_length)
+
+    def hash_many(self, passwords):
+        # Hashes a batch in parallel on the bulk pool (used by bulk imports and fixtures).
+        if not self.workers or not self.bulk_workers:
+            return [generate_password_hash(p, self.method, self.salt_length) for p in passwords]
+        executor = self._get_bulk_executor()
+        count = len(passwords)
+        return list(executor.map(
+            generate_password_hash, passwords, [self.method] * count, [self.salt_length] * count,
+            chunksize=max(1, count // (self.bulk_workers * 4))
+        ))
+
+    def verify(self, password_hash, password):
+        return self._call(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # True when the hash was not made with the configured method and parameters.
+        if self._current_prefix is None:
+            # werkzeug fills in default parameters (e.g. pbkdf2 iterations); hash once to learn them.
+            self._current_prefix = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._current_prefix
+
+    def shutdown(self):
+        with self._lock:
+            executors = [self._executor, self._bulk_executor]
+            self._executor = self._bulk_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _call(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordHasherBusy()
+            self._pending += 1
+        try:
+            return self._get_executor().submit(function, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: the web process may already run other threads.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _get_bulk_executor(self):
+        with self._lock:
+            if self._bulk_executor is None:
+                self._bulk_executor = ProcessPoolExecutor(
+                    max_workers=self.bulk_workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._bulk_executor
+
+def _benchmark(verify, password_hash, seconds, concurrency):
+    # Runs verify() from `concurrency` threads for `seconds` and returns verifications per second.
+    deadline = time.perf_counter() + seconds
+    counts = [0] * concurrency
+
+    def worker(index):
+        while time.perf_counter() < deadline:
+            verify(password_hash, 'benchmark-password')
+            counts[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+@click.command('benchmark-password-hashing')
+@click.option('--seconds', default=5.0, show_default=True, help='Duration of each run.')
+@click.option('--concurrency', default=None, type=int, help='Concurrent logins (default: 4 per pool worker).')
+@with_appcontext
+def benchmark_password_hashing_command(seconds, concurrency):
+    """Measure password verifications (logins) per second, inline and on the hashing pool."""
+    from app import password_hasher
+    workers = password_hasher.workers or 1
+    concurrency = concurrency or workers * 4
+    cores = os.cpu_count() or 1
+    password_hash = generate_password_hash('benchmark-password', password_hasher.method, password_hasher.salt_length)
+    click.echo(f'Method {password_hasher.method}, {cores} core(s), {concurrency} concurrent logins.')
+
+    inline = _benchmark(check_password_hash, password_hash, seconds, concurrency)
+    click.echo(f'Inline on request threads: {inline:.1f} logins/s ({inline / cores:.1f} per core)')
+    if password_hasher.workers:
+        password_hasher.verify(password_hash, 'benchmark-password')  # start the pool outside the timing
+        pooled = _benchmark(password_hasher.verify, password_hash, seconds, concurrency)
+        click.echo(f'Process pool ({workers} workers): {pooled:.1f} logins/s ({pooled / cores:.1f} per core)')
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+
+DOCTORS_PATIENTS_TAG = 'doctors-patients'
+
+def patient_tag(patient_id):
+    return ('patient', patient_id)
+
+def treatment_tag(treatment_id):
+    return ('treatment', treatment_id)
+
+def user_tag(user_id):
+    return ('user', user_id)
+
+class ReportCache:
+    # Per-process cache of computed report payloads with TTL expiry, LRU eviction and
+    # tag-based invalidation. Entries are tagged with the rows they were built from so
+    # writes can evict exactly the reports they affect.
+
+    def __init__(self, app=None):
+        self.max_entries = 256
+        self.ttl_seconds = 30
+        self.enabled = True
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._keys_by_tag = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('REPORT_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl_seconds = app.config.get('REPORT_CACHE_TTL_SECONDS', self.ttl_seconds)
+        self.enabled = app.config.get('REPORT_CACHE_ENABLED', self.enabled)
+        self.clear()
+        self.reset_stats()
+
+    def get_or_set(self, key, compute):
+        # compute() returns (value, tags). None values are returned but never cached.
+        if not self.enabled:
+            return compute()[0]
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            generation = self._generation
+
+        value, tags = compute()
+        if value is None:
+            return value
+
+        with self._lock:
+            # Skip storing if a write invalidated anything while the value was being computed.
+            if generation != self._generation:
+                return value
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, tuple(tags))
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
@@ -0,0 +1,86 @@
+import datetime
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+class ReportJobQueueFull(Exception):
+    pass
+
+class ReportJobs:
+    # Runs long report computations on a bounded thread pool so request workers return
+    # immediately. Finished results are kept for a configurable time and then dropped.
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_workers = 2
+        self.max_pending = 16
+        self.result_ttl_seconds = 600
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('REPORT_JOB_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('REPORT_JOB_MAX_PENDING', self.max_pending)
+        self.result_ttl_seconds = app.config.get('REPORT_JOB_RESULT_TTL_SECONDS', self.result_ttl_seconds)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='report-job')
+        with self._lock:
+            self._jobs.clear()
+
+    def submit(self, kind, compute):
+        # compute() runs inside an application context and returns the JSON-serialisable result.
+        # Raises ReportJobQueueFull when too many jobs are already waiting or running.
+        with self._lock:
+            self._purge_expired()
+            active = sum(1 for job in self._jobs.values() if job['status'] in ('pending', 'running'))
+            if active >= self.max_pending:
+                raise ReportJobQueueFull()
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'kind': kind,
+                'status': 'pending',
+                'submitted_at': datetime.datetime.now(),
+                'finished_at': None,
+                'result': None,
+                'error': None
+            }
+        self._executor.submit(self._run, job_id, compute)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job_id, compute):
+        self._update(job_id, status='running')
+        try:
+            with self.app.app_context():
+                result = compute()
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e), finished_at=datetime.datetime.now())
+        else:
+            self._update(job_id, status='completed', result=result, finished_at=datetime.datetime.now())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _purge_expired(self):
+        now = datetime.datetime.now()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['finished_at'] is not None
+            and (now - job['finished_at']).total_seconds() > self.result_ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,200 @@
+import datetime
+from sqlalchemy import or_, and_
+from app.models import User, Patient, Treatment, PatientTreatment, PatientAssistant, TreatmentLog, patient_treatments_all, ensure_patient_treatments_all_view
+from app import db
+from app.statistics import get_top_treatments, get_top_assistants, get_average_apply_hours
+
+def get_doctor_patient_rows():
+    # Returns (doctor_id, patient_id, patient_name) for every distinct doctor/patient pair,
+    # ordered by doctor and patient so the rows can be grouped in a single pass.
+    return (
+        db.session.query(PatientAssistant.doctor_id, Patient.id, Patient.name)
+        .join(Patient, Patient.id == PatientAssistant.patient_id)
+        .join(User, User.id == PatientAssistant.doctor_id)
+        .filter(User.role == 'Doctor')
+        .distinct()
+        .order_by(PatientAssistant.doctor_id, Patient.id)
+        .all()
+    )
+
+def get_report_statistics(total_doctors, total_patients):
+    # Statistics block of the doctors-patients report. Top-N and latency values come from the
+    # incrementally maintained summary tables (see app/statistics.py) instead of full scans.
+    avg_patients_per_doctor = total_patients / total_doctors if total_doctors > 0 else 0
+
+    best_treatments_list = [{'name': t[0], 'times_prescribed': t[1]} for t in get_top_treatments()]
+    top_assistants = [{'name': a[0], 'patients_assigned': a[1]} for a in get_top_assistants()]
+    avg_time_to_apply = get_average_apply_hours()
+
+    return {
+        'total_doctors': total_doctors,
+        'total_patients': total_patients,
+        'avg_patients_per_doctor': round(avg_patients_per_doctor, 2),
+        'best_used_treatments': best_treatments_list,
+        'most_assigned_assistants': top_assistants,
+        'average_time_to_apply_treatment_hours': avg_time_to_apply
+    }
+
+def build_doctor_patient_report():
+    # Builds the doctors-patients report with a fixed number of queries, independent of the doctor count.
+    # Returns None when there are no doctors.
+    doctors = User.query.filter_by(role='Doctor').order_by(User.id).all()
+    if not doctors:
+        return None
+
+    patients_by_doctor = {}
+    for doctor_id, patient_id, patient_name in get_doctor_patient_rows():
+        patients_by_doctor.setdefault(doctor_id, []).append({'id': patient_id, 'name': patient_name})
+
+    report_data = []
+    total_patients = 0
+
+    for doctor in doctors:
+        patients = patients_by_doctor.get(doctor.id, [])
+        total_patients += len(patients)
+
+        report_data.append({
+            'doctor_id': doctor.id,
+            'doctor_name': doctor.name,
+            'patients': patients
+        })
+
+    return {
+        'report': report_data,
+        'statistics': get_report_statistics(len(doctors), total_patients)
+    }
+
+def iter_doctor_patient_blocks(batch_size=1000):
+    # Streams the per-doctor entries of the doctors-patients report one doctor at a time.
+    # Rows come from a server-side cursor so memory does not grow with the number of patients.
+    rows = (
+        db.session.query(User.id, User.name, Patient.id, Patient.name)
+        .outerjoin(PatientAssistant, PatientAssistant.doctor_id == User.id)
+        .outerjoin(Patient, Patient.id == PatientAssistant.patient_id)
+        .filter(User.role == 'Doctor')
+        .distinct()
+        .order_by(User.id, Patient.id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+
+    current = None
+    for doctor_id, doctor_name, patient_id, patient_name in rows:
+        if current is None or current['doctor_id'] != doctor_id:
+            if current is not None:
+                yield current
+            current = {'doctor_id': doctor_id, 'doctor_name': doctor_name, 'patients': []}
+        if patient_id is not None:
+            current['patients'].append({'id': patient_id, 'name': patient_name})
+    if current is not None:
+        yield current
+
+PATIENT_TREATMENT_FIELDS = ('id', 'name', 'description', 'prescribed_by', 'applied_by', 'applied_at', 'status')
+ARCHIVED_PATIENT_TREATMENT_FIELDS = PATIENT_TREATMENT_FIELDS + ('archived',)
+
+def _patient_treatment_columns(source):
+    # source: PatientTreatment, or the columns of the patient_treatments_all view.
+    columns = {
+        'id': Treatment.id,
+        'name': Treatment.name,
+        'description': Treatment.description,
+        'prescribed_by': source.prescribed_by,
+        'applied_by': source.applied_by,
+        'applied_at': source.applied_at,
+        'status': source.status
+    }
+    if hasattr(source, 'archived'):
+        columns['archived'] = source.archived
+    return columns
+
+def build_patient_treatments_report(patient_id, fields=None, include_archived=False):
+    # Treatment history of one patient. Returns None when the patient does not exist.
+    # Only the columns named in `fields` (default: all) are selected. Archived rows are read
+    # through the patient_treatments_all view, and only when include_archived is set.
+    patient = db.session.get(Patient, patient_id)
+    if not patient:
+        return None
+
+    if include_archived:
+        ensure_patient_treatments_all_view()
+    table = patient_treatments_all if include_archived else PatientTreatment
+    source = patient_treatments_all.c if include_archived else PatientTreatment
+    columns = _patient_treatment_columns(source)
+    fields = fields or list(columns)
+    treatments = (
+        db.session.query(*[columns[field].label(field) for field in fields])
+        .select_from(Treatment)
+        .join(table, Treatment.id == source.treatment_id)
+        .filter(source.patient_id == patient_id)
+        .all()
+    )
+
+    treatment_list = []
+    for treatment in treatments:
+        entry = treatment._asdict()
+        if 'applied_at' in entry:
+            entry['applied_at'] = treatment.applied_at.strftime('%Y-%m-%d %H:%M:%S') if treatment.applied_at else None
+        treatment_list.append(entry)
+
+    return {
+        'patient_id': patient.id,
+        'patient_name': patient.name,
+        'treatments': treatment_list
+    }
+
+TREATMENT_LOG_FIELDS = ('id', 'patient_id', 'treatment_id', 'applied_by', 'applied_at', 'notes')
+
+def format_treatment_log_cursor(log):
+    # Cursor of the treatment logs pages: "<applied_at ISO 8601>,<id>" (applied_at empty if NULL).
+    return f"{log.applied_at.isoformat() if log.applied_at else ''},{log.id}"
+
+def parse_treatment_log_cursor(value):
+    # Inverse of format_treatment_log_cursor; returns (applied_at, id). Raises ValueError.
+    applied_at, separator, log_id = value.rpartition(',')
+    if not separator:
+        raise ValueError(value)
+    return (datetime.datetime.fromisoformat(applied_at) if applied_at else None), int(log_id)
+
+def query_treatment_logs(patient_id=None, assistant_id=None, applied_from=None, applied_to=None,
+                         fields=TREATMENT_LOG_FIELDS, limit=100, after=None):
+    # Treatment logs in [applied_from, applied_to), optionally for one patient and/or assistant.
+    # The filters match the (patient_id, applied_at), (applied_by, applied_at) and (applied_at)
+    # indexes; on a partitioned table the time window also prunes the scanned months.
+    # Pages are ordered by (applied_at, id) with `after` = (applied_at, id) of the previous page's
+    # last row: the index entries end with the primary key, so the index range returns rows in
+    # that order and a page reads only its own rows, with no sort. NULL applied_at sorts first.
+    # Returns (entries, next_cursor).
+    columns = {'id', 'applied_at', *fields}
+    query = TreatmentLog.query.options(db.load_only(*[getattr(TreatmentLog, field) for field in TREATMENT_LOG_FIELDS if field in columns]))
+    if patient_id is not None:
+        query = query.filter(TreatmentLog.patient_id == patient_id)
+    if assistant_id is not None:
+        query = query.filter(TreatmentLog.applied_by == assistant_id)
+    if applied_from is not None:
+        query = query.filter(TreatmentLog.applied_at >= applied_from)
+    if applied_to is not None:
+        query = query.filter(TreatmentLog.applied_at < applied_to)
+    if after is not None:
+        after_applied_at, after_id = after
+        if after_applied_at is None:
+            query = query.filter(or_(
+                TreatmentLog.applied_at.isnot(None),
+                and_(TreatmentLog.applied_at.is_(None), TreatmentLog.id > after_id)
+            ))
+        else:
+            query = query.filter(or_(
+                TreatmentLog.applied_at > after_applied_at,
+                and_(TreatmentLog.applied_at == after_applied_at, TreatmentLog.id > after_id)
+            ))
+
+    logs = query.order_by(TreatmentLog.applied_at, TreatmentLog.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = format_treatment_log_cursor(logs[-1])
+    entries = []
+    for log in logs:
+        entry = {field: getattr(log, field) for field in fields}
+        if 'applied_at' in entry:
+            entry['applied_at'] = log.applied_at.strftime('%Y-%m-%d %H:%M:%S') if log.applied_at else None
+        entries.append(entry)
+    return entries, next_cursor
@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.models import User
-from app import db
-from app.utils import check_json, get_user_by_id, check_role, update_user_fields
+from app import db, report_cache
+from app.utils import check_json, get_user_by_id, check_role, update_user_fields, delete_user_references, get_pagination_args, paginate_by_id
+from app.report_cache import DOCTORS_PATIENTS_TAG, user_tag
 
 assistant_bp = Blueprint('assistant_bp', __name__)
 
@@ -13,10 +14,16 @@ def get_assistants():
     if role_error:
         return role_error
 
-    assistants = User.query.filter_by(role='Assistant').all()
+    limit, after, page_error = get_pagination_args()
+    if page_error:
+        return page_error
+
+    assistants, next_cursor = paginate_by_id(
+        db.session.query(User.id, User.name).filter(User.role == 'Assistant'), User.id, limit, after
+    )
     if not assistants:
         return jsonify({'message': 'No assistants found'}), 204
-    return jsonify({'assistants': [{'id': a.id, 'name': a.name} for a in assistants]}), 200
+    return jsonify({'assistants': [{'id': a.id, 'name': a.name} for a in assistants], 'next_cursor': next_cursor}), 200
 
 
 @assistant_bp.route('/<int:assistant_id>', methods=['PUT'])
@@ -36,8 +43,11 @@ def update_assistant(assistant_id):
     if all(field not in data for field in ['name', 'password', 'role']):
         return jsonify({'error': 'At least one field (name, password, role) is required'}), 400
 
-    update_user_fields(assistant, data)
+    name_error = update_user_fields(assistant, data)
+    if name_error:
+        return name_error
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG)
     return jsonify({'message': 'Assistant updated'})
 
 
@@ -52,10 +62,9 @@ def delete_assistant(assistant_id):
     if not assistant:
         return jsonify({'error': 'User not found'}), 404
 
-    from app.models.patient_assistant import PatientAssistant
-    PatientAssistant.query.filter_by(assistant_id=assistant.id).delete()
-    db.session.commit()
+    delete_user_references(assistant.id)
 
     db.session.delete(assistant)
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, user_tag(assistant_id))
     return jsonify({'message': 'Assistant deleted successfully'}), 200
\ No newline at end of file
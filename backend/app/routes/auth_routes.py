@@ -1,9 +1,11 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.security import check_password_hash, generate_password_hash
-from flask_jwt_extended import create_access_token, jwt_required
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt, get_jwt_identity
 from app.models import User
-from app import db
-from app.utils import check_json, get_user_by_id, check_role
+from app import db, report_cache, password_hasher, token_revocations, login_throttle
+from app.password_hasher import PasswordHasherBusy
+from app.utils import check_json, get_user_by_id, check_role, get_bulk_items, hasher_busy_response
+from app.staff_import import read_staff_file, import_staff, STAFF_FILE_FORMATS
+from app.report_cache import DOCTORS_PATIENTS_TAG
 
 auth_bp = Blueprint('auth_bp', __name__)
 
@@ -15,15 +17,56 @@ def login():
 
     if "name" not in data or "password" not in data:
         return jsonify({"error": "Missing name or password"}), 400
-    
+
+    # Rejected before the lookup so a flood of attempts never reaches the password hash. Every
+    # attempt is charged up front; successful ones are refunded below.
+    retry_after = login_throttle.check(str(data['name']), request.remote_addr)
+    if retry_after:
+        return jsonify({'error': 'Too many login attempts, retry later'}), 429, {'Retry-After': str(retry_after)}
+
     user = User.query.filter_by(name=data['name']).first()
     if not user:
         return jsonify({'error': 'User with this name was not found'}), 404
-    if not check_password_hash(user.password_hash, data['password']):
-        return jsonify({'error': 'Invalid password'}), 401
-    
-    token = create_access_token(identity={'id': user.id, 'role': user.role})
-    return jsonify({'message': 'Login successful', 'access_token': token}), 200
+    try:
+        if not password_hasher.verify(user.password_hash, data['password']):
+            return jsonify({'error': 'Invalid password'}), 401
+    except PasswordHasherBusy:
+        login_throttle.refund(str(data['name']), request.remote_addr)
+        return jsonify({'error': 'Too many logins in progress, retry shortly'}), 503, {'Retry-After': '1'}
+    login_throttle.refund(str(data['name']), request.remote_addr)
+
+    # Transparently upgrade hashes made with older parameters; when the pool is full the upgrade
+    # waits for a later login rather than failing this one.
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.password_hash = password_hasher.hash(data['password'])
+            db.session.commit()
+        except PasswordHasherBusy:
+            pass
+
+    identity = {'id': user.id, 'role': user.role}
+    return jsonify({
+        'message': 'Login successful',
+        'access_token': create_access_token(identity=identity),
+        'refresh_token': create_refresh_token(identity=identity)
+    }), 200
+
+
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    # Mints a new access token from a valid, unrevoked refresh token: signature and in-memory
+    # revocation checks only, no password hash and no user lookup.
+    token = create_access_token(identity=get_jwt_identity())
+    return jsonify({'access_token': token}), 200
+
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    # Revokes the presented token; send the refresh token to end the session.
+    token_revocations.revoke(get_jwt())
+    return jsonify({'message': 'Token revoked'}), 200
 
 
 @auth_bp.route('/register', methods=['POST'])
@@ -47,11 +90,53 @@ def register():
     if User.query.filter_by(name=data['name']).first():
         return jsonify({'error': 'User with this name already exists'}), 400
 
+    try:
+        password_hash = password_hasher.hash(data['password'])
+    except PasswordHasherBusy:
+        return hasher_busy_response()
+
     new_user = User(
         name=data['name'],
         role=data['role'],
-        password_hash=generate_password_hash(data['password'])
+        password_hash=password_hash
     )
     db.session.add(new_user)
     db.session.commit()
-    return jsonify({'message': f'User {new_user.name} - Role {new_user.role} registered'}), 201
\ No newline at end of file
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG)
+    return jsonify({'message': f'User {new_user.name} - Role {new_user.role} registered'}), 201
+
+
+@auth_bp.route('/register/bulk', methods=['POST'])
+@jwt_required()
+def register_bulk():
+    role_error = check_role(['General Manager'])
+    if role_error:
+        return role_error
+
+    # Either a JSON body {"staff": [...]} or a .json / .csv file uploaded as multipart field "file".
+    upload = request.files.get('file')
+    if upload is None:
+        rows, bulk_error = get_bulk_items('staff')
+        if bulk_error:
+            return bulk_error
+    else:
+        file_format = (request.form.get('format') or upload.filename.rsplit('.', 1)[-1]).lower()
+        if file_format not in STAFF_FILE_FORMATS:
+            return jsonify({'error': 'File must be .json or .csv (or pass format=json|csv)'}), 400
+        try:
+            rows = read_staff_file(upload.read().decode('utf-8-sig'), file_format)
+        except (UnicodeDecodeError, ValueError) as error:
+            return jsonify({'error': f'Could not read staff file: {error}'}), 400
+        if not rows:
+            return jsonify({'error': 'Staff file is empty'}), 400
+        max_items = current_app.config.get('BULK_MAX_ITEMS', 10000)
+        if len(rows) > max_items:
+            return jsonify({'error': f'At most {max_items} staff can be sent in one request'}), 413
+
+    results = import_staff(rows)
+    created = sum(1 for result in results if result['status'] == 'created')
+    return jsonify({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }), 201 if created else 200
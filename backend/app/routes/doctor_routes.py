@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.models import User
-from app import db
-from app.utils import check_json, get_user_by_id, check_role, update_user_fields
+from app import db, report_cache
+from app.utils import check_json, get_user_by_id, check_role, update_user_fields, delete_user_references, get_pagination_args, paginate_by_id
+from app.report_cache import DOCTORS_PATIENTS_TAG, user_tag
 
 doctor_bp = Blueprint('doctor_bp', __name__)
 
@@ -13,10 +14,16 @@ def get_doctors():
     if role_error:
         return role_error
 
-    doctors = User.query.filter_by(role='Doctor').all()
+    limit, after, page_error = get_pagination_args()
+    if page_error:
+        return page_error
+
+    doctors, next_cursor = paginate_by_id(
+        db.session.query(User.id, User.name).filter(User.role == 'Doctor'), User.id, limit, after
+    )
     if not doctors:
         return jsonify({'message': 'No doctors found'}), 204
-    return jsonify({'doctors': [{'id': d.id, 'name': d.name} for d in doctors]}), 200
+    return jsonify({'doctors': [{'id': d.id, 'name': d.name} for d in doctors], 'next_cursor': next_cursor}), 200
 
 
 @doctor_bp.route('/<int:doctor_id>', methods=['PUT'])
@@ -36,8 +43,11 @@ def update_doctor(doctor_id):
     if all(field not in data for field in ['name', 'password', 'role']):
         return jsonify({'error': 'At least one field (name, password, role) is required'}), 400
 
-    update_user_fields(doctor, data)
+    name_error = update_user_fields(doctor, data)
+    if name_error:
+        return name_error
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG)
     return jsonify({'message': 'Doctor updated'})
 
 
@@ -52,6 +62,9 @@ def delete_doctor(doctor_id):
     if not doctor:
         return jsonify({'error': 'User not found'}), 404
 
+    delete_user_references(doctor.id)
+
     db.session.delete(doctor)
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, user_tag(doctor_id))
     return jsonify({'message': 'Doctor deleted successfully'}), 200
@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.models import User
-from app import db
-from app.utils import check_json, get_user_by_id, check_role, update_user_fields
+from app import db, report_cache
+from app.utils import check_json, get_user_by_id, check_role, update_user_fields, delete_user_references, get_pagination_args, paginate_by_id
+from app.report_cache import DOCTORS_PATIENTS_TAG, user_tag
 
 manager_bp = Blueprint('manager_bp', __name__)
 
@@ -13,10 +14,16 @@ def get_managers():
     if role_error:
         return role_error
 
-    managers = User.query.filter_by(role='General Manager').all()
+    limit, after, page_error = get_pagination_args()
+    if page_error:
+        return page_error
+
+    managers, next_cursor = paginate_by_id(
+        db.session.query(User.id, User.name).filter(User.role == 'General Manager'), User.id, limit, after
+    )
     if not managers:
         return jsonify({'message': 'No managers found'}), 204
-    return jsonify({'managers': [{'id': m.id, 'name': m.name} for m in managers]}), 200
+    return jsonify({'managers': [{'id': m.id, 'name': m.name} for m in managers], 'next_cursor': next_cursor}), 200
 
 
 @manager_bp.route('/<int:manager_id>', methods=['PUT'])
@@ -36,8 +43,11 @@ def update_manager(manager_id):
     if all(field not in data for field in ['name', 'password', 'role']):
         return jsonify({'error': 'At least one field (name, password, role) is required'}), 400
 
-    update_user_fields(manager, data)
+    name_error = update_user_fields(manager, data)
+    if name_error:
+        return name_error
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG)
     return jsonify({'message': 'Manager updated'})
 
 @manager_bp.route('/<int:manager_id>', methods=['DELETE'])
@@ -51,6 +61,9 @@ def delete_manager(manager_id):
     if not manager:
         return jsonify({'error': 'User not found'}), 404
 
+    delete_user_references(manager.id)
+
     db.session.delete(manager)
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, user_tag(manager_id))
     return jsonify({'message': f'User {manager} deleted successfully'}), 200
\ No newline at end of file
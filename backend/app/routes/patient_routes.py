@@ -1,8 +1,12 @@
-from flask import Blueprint, request, jsonify
-from app import db
-from app.models import User, Patient, Treatment, PatientAssistant, PatientTreatment
+from collections import Counter
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy import insert
+from app import db, report_cache
+from app.models import User, Patient, Treatment, PatientAssistant, PatientTreatment, PatientTreatmentArchive, TreatmentLog
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.utils import get_patient_by_id, get_current_user, check_json, get_user_by_id, check_role, update_user_fields
+from app.utils import get_patient_by_id, get_current_user, check_json, get_user_by_id, check_role, update_user_fields, get_pagination_args, paginate_by_id, search_patients_by_name, get_bulk_items, chunked
+from app import statistics
+from app.report_cache import DOCTORS_PATIENTS_TAG, patient_tag
 
 patients_bp = Blueprint("patients_bp", __name__)
 
@@ -29,13 +33,91 @@ def create_patient():
 
     return jsonify({'message': 'Patient created successfully'}), 201
 
+@patients_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_patients_bulk():
+    role_error = check_role(['General Manager', 'Doctor'])
+    if role_error:
+        return role_error
+
+    items, bulk_error = get_bulk_items('patients')
+    if bulk_error:
+        return bulk_error
+
+    results = []
+    names = set()
+    for index, item in enumerate(items):
+        name = item.get('name') if isinstance(item, dict) else None
+        if not isinstance(name, str) or not name:
+            results.append({'index': index, 'status': 'invalid', 'error': 'Name field must be filled'})
+        elif name.casefold() in names:
+            # Case-insensitive, as name comparisons are on MySQL.
+            results.append({'index': index, 'name': name, 'status': 'duplicate', 'error': 'Name repeated in this batch'})
+        else:
+            names.add(name.casefold())
+            results.append({'index': index, 'name': name, 'status': 'created'})
+
+    # One query for every duplicate against existing patients.
+    candidates = [result['name'] for result in results if result['status'] == 'created']
+    existing = {
+        name.casefold() for (name,) in db.session.query(Patient.name).filter(Patient.name.in_(candidates)).all()
+    } if candidates else set()
+    new_names = []
+    for result in results:
+        if result['status'] == 'created' and result['name'].casefold() in existing:
+            result['status'] = 'duplicate'
+            result['error'] = 'Patient with this name already exists'
+        elif result['status'] == 'created':
+            new_names.append(result['name'])
+
+    # Multi-row INSERTs in chunks, all in one transaction.
+    for chunk in chunked(new_names, current_app.config.get('BULK_INSERT_CHUNK_SIZE', 1000)):
+        db.session.execute(insert(Patient), [{'name': name} for name in chunk])
+    db.session.flush()
+
+    ids = dict(
+        db.session.query(Patient.name, Patient.id).filter(Patient.name.in_(new_names)).all()
+    ) if new_names else {}
+    db.session.commit()
+
+    for result in results:
+        if result['status'] == 'created':
+            result['id'] = ids.get(result['name'])
+
+    created = len(new_names)
+    return jsonify({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }), 201 if created else 200
+
 @patients_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_all_patients():
-    patients = Patient.query.all()
+    limit, after, page_error = get_pagination_args()
+    if page_error:
+        return page_error
+
+    patients, next_cursor = paginate_by_id(db.session.query(Patient.id, Patient.name), Patient.id, limit, after)
     if not patients:
         return jsonify({'message':'No patients found'}),204
-    return jsonify({'patients': [{'id': p.id, 'name': p.name} for p in patients]}), 200
+    return jsonify({'patients': [{'id': p.id, 'name': p.name} for p in patients], 'next_cursor': next_cursor}), 200
+
+@patients_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_patients():
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q must be filled'}), 400
+
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1 or limit > 100:
+        return jsonify({'error': 'limit must be between 1 and 100'}), 400
+
+    return jsonify({'query': query, 'patients': search_patients_by_name(query, limit)}), 200
 
 @patients_bp.route('/<int:patient_id>', methods=['GET'])
 @jwt_required()
@@ -70,6 +152,7 @@ def update_patient(patient_id):
         patient.name = data['name']
 
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, patient_tag(patient_id))
     return jsonify({'message': 'Patient updated successfully'}), 200
 
 @patients_bp.route('/<int:patient_id>', methods=['DELETE'])
@@ -83,13 +166,20 @@ def delete_patient(patient_id):
     if patient is None:
         return jsonify({'error': 'Patient not found'}), 404
 
-    from app.models.patient_assistant import PatientAssistant
-    assistants_to_remove = PatientAssistant.query.filter_by(patient_id=patient.id).all()
-    for pa_row in assistants_to_remove:
-        db.session.delete(pa_row)
+    statistics.forget_patient_assistants(PatientAssistant.patient_id == patient.id)
+    statistics.forget_patient_treatments(PatientTreatment.patient_id == patient.id)
+    statistics.forget_patient_treatments(PatientTreatmentArchive.patient_id == patient.id, model=PatientTreatmentArchive)
+
+    # Set-based deletes of the dependent rows; the relationships use passive_deletes so the ORM
+    # does not load them when the patient is deleted.
+    PatientAssistant.query.filter_by(patient_id=patient.id).delete(synchronize_session=False)
+    PatientTreatment.query.filter_by(patient_id=patient.id).delete(synchronize_session=False)
+    PatientTreatmentArchive.query.filter_by(patient_id=patient.id).delete(synchronize_session=False)
+    TreatmentLog.query.filter_by(patient_id=patient.id).delete(synchronize_session=False)
 
     db.session.delete(patient)
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, patient_tag(patient_id))
 
     return jsonify({'message': 'Patient deleted successfully'}), 200
 
@@ -150,12 +240,101 @@ def assign_patient_to_assistant(patient_id):
         doctor_id=doctor_id
     )
     db.session.add(new_assignment)
+    statistics.record_assignments({assistant_user.id: 1})
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG)
 
     return jsonify({
         'message': f'Patient {patient_id} assigned to Assistant {assistant_user.id} under Doctor {doctor_id}'
     }), 201
 
+@patients_bp.route('/assign/bulk', methods=['POST'])
+@jwt_required()
+def assign_patients_to_assistants_bulk():
+    current_user = get_current_user()
+    if current_user['role'] not in ['General Manager', 'Doctor']:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    items, bulk_error = get_bulk_items('assignments')
+    if bulk_error:
+        return bulk_error
+
+    if current_user['role'] == 'Doctor':
+        doctor_id = current_user['id']
+    else:
+        doctor_id = request.get_json().get('doctor_id')
+        if doctor_id is None:
+            return jsonify({'error': 'doctor_id must be specified by the General Manager'}), 400
+        # bool is a subclass of int: reject true/false explicitly.
+        if not isinstance(doctor_id, int) or isinstance(doctor_id, bool):
+            return jsonify({'error': 'doctor_id must be an integer'}), 400
+
+    pairs = []
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get('patient_id'), int) and isinstance(item.get('assistant_id'), int):
+            pairs.append((item['patient_id'], item['assistant_id']))
+        else:
+            pairs.append(None)
+    patient_ids = {pair[0] for pair in pairs if pair}
+    assistant_ids = {pair[1] for pair in pairs if pair}
+
+    # Set-based prefetch: referenced users, patients and their existing assignments.
+    roles = dict(db.session.query(User.id, User.role).filter(User.id.in_(assistant_ids | {doctor_id})).all())
+    if doctor_id not in roles:
+        return jsonify({'error': 'Doctor user not found'}), 404
+    existing_patients = {
+        patient_id for (patient_id,) in db.session.query(Patient.id).filter(Patient.id.in_(patient_ids)).all()
+    } if patient_ids else set()
+    owners = {}
+    assigned = set()
+    if existing_patients:
+        rows = (
+            db.session.query(PatientAssistant.patient_id, PatientAssistant.assistant_id, PatientAssistant.doctor_id)
+            .filter(PatientAssistant.patient_id.in_(existing_patients))
+            .all()
+        )
+        for patient_id, assistant_id, owner_id in rows:
+            owners.setdefault(patient_id, set()).add(owner_id)
+            if owner_id == doctor_id:
+                assigned.add((patient_id, assistant_id))
+
+    results = []
+    new_rows = []
+    for index, pair in enumerate(pairs):
+        if pair is None:
+            results.append({'index': index, 'status': 'invalid', 'error': 'patient_id and assistant_id must be integers'})
+            continue
+        patient_id, assistant_id = pair
+        result = {'index': index, 'patient_id': patient_id, 'assistant_id': assistant_id}
+        if patient_id not in existing_patients:
+            result.update(status='not_found', error='Patient not found')
+        elif assistant_id not in roles:
+            result.update(status='not_found', error='Assistant user not found')
+        elif roles[assistant_id] != 'Assistant':
+            result.update(status='invalid', error='User is not an Assistant')
+        elif owners.get(patient_id, {doctor_id}) != {doctor_id}:
+            result.update(status='conflict', error='This patient already belongs to another doctor')
+        elif pair in assigned:
+            result.update(status='already_assigned')
+        else:
+            assigned.add(pair)
+            new_rows.append({'patient_id': patient_id, 'assistant_id': assistant_id, 'doctor_id': doctor_id})
+            result.update(status='assigned')
+        results.append(result)
+
+    for chunk in chunked(new_rows, current_app.config.get('BULK_INSERT_CHUNK_SIZE', 1000)):
+        db.session.execute(insert(PatientAssistant), chunk)
+    statistics.record_assignments(Counter(row['assistant_id'] for row in new_rows))
+    db.session.commit()
+    if new_rows:
+        report_cache.invalidate(DOCTORS_PATIENTS_TAG)
+
+    return jsonify({
+        'doctor_id': doctor_id,
+        'assigned': len(new_rows),
+        'results': results
+    }), 201 if new_rows else 200
+
 @patients_bp.route('/doctor/patients', methods=['GET'])
 @jwt_required()
 def get_patients_by_doctor():
@@ -163,33 +342,37 @@ def get_patients_by_doctor():
     if current_user['role'] not in ['Doctor', 'General Manager']:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    data = check_json()
-    if isinstance(data, dict) and 'error' in data:
-        return data
+    limit, after, page_error = get_pagination_args()
+    if page_error:
+        return page_error
 
     if current_user['role'] == 'Doctor':
         doctor_id = current_user['id']
     else:
-        if 'doctor_id' not in data or not data['doctor_id']:
+        # doctor_id comes from the query string; a JSON body is still accepted for older clients.
+        doctor_id = request.args.get('doctor_id', type=int)
+        if doctor_id is None and request.is_json:
+            body = request.get_json(silent=True)
+            doctor_id = body.get('doctor_id') if isinstance(body, dict) else None
+            # bool is a subclass of int: reject true/false explicitly.
+            if doctor_id is not None and (not isinstance(doctor_id, int) or isinstance(doctor_id, bool)):
+                return jsonify({'error': 'doctor_id must be an integer'}), 400
+        if not doctor_id:
             return jsonify({'error': 'doctor_id must be specified by the General Manager'}), 400
-        doctor_id = data['doctor_id']
 
-    doctor = User.query.get(doctor_id)
+    doctor = db.session.get(User, doctor_id)
     if not doctor or doctor.role != 'Doctor':
         return jsonify({'error': 'Doctor not found or invalid role'}), 404
 
-    from app.models.patient_assistant import PatientAssistant
-
-    assignments = (
-        PatientAssistant.query
-        .filter_by(doctor_id=doctor.id)
-        .all()
+    patients_query = (
+        db.session.query(Patient.id, Patient.name)
+        .join(PatientAssistant, PatientAssistant.patient_id == Patient.id)
+        .filter(PatientAssistant.doctor_id == doctor.id)
+        .distinct()
     )
-    if not assignments:
+    patients, next_cursor = paginate_by_id(patients_query, Patient.id, limit, after)
+    if not patients and after is None:
         return jsonify({'message': 'No patients found for this doctor'}), 200
 
-    patient_ids = [a.patient_id for a in assignments]
-    patients = Patient.query.filter(Patient.id.in_(patient_ids)).all()
     result = [{'id': p.id, 'name': p.name} for p in patients]
-
-    return jsonify({'doctor_id': doctor.id, 'patients': result}), 200
\ No newline at end of file
+    return jsonify({'doctor_id': doctor.id, 'patients': result, 'next_cursor': next_cursor}), 200
@@ -1,13 +1,76 @@
-from flask import Blueprint, jsonify
+import csv
+import datetime
+import io
+import math
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required
-from sqlalchemy import func
-from sqlalchemy.sql import text
-from app.models import User, Patient, Treatment, PatientTreatment, PatientAssistant
-from app import db
-from app.utils import get_current_user, check_json, get_user_by_id, check_role, update_user_fields
+from app.models import User, PatientAssistant
+from app import report_cache, report_jobs, treatment_log_writer
+from app.utils import get_current_user, get_fields_arg, get_limit_arg
+from app.reports import build_doctor_patient_report, build_patient_treatments_report, iter_doctor_patient_blocks, get_report_statistics, PATIENT_TREATMENT_FIELDS, ARCHIVED_PATIENT_TREATMENT_FIELDS, TREATMENT_LOG_FIELDS, query_treatment_logs, parse_treatment_log_cursor
+from app.report_cache import DOCTORS_PATIENTS_TAG, patient_tag, treatment_tag, user_tag
+from app.report_jobs import ReportJobQueueFull
+from app.latency_analytics import GROUP_COLUMNS, compute_apply_latency_distribution
 
 report_bp = Blueprint('reports_bp', __name__)
 
+def report_cache_key():
+    # Cache key made of the endpoint, its URL arguments and the query string.
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True)))
+    )
+
+def patient_treatments_report_tags(report):
+    tags = {patient_tag(report['patient_id'])}
+    for treatment in report['treatments']:
+        tags.add(treatment_tag(treatment['id']))
+        if treatment.get('prescribed_by'):
+            tags.add(user_tag(treatment['prescribed_by']))
+        if treatment.get('applied_by'):
+            tags.add(user_tag(treatment['applied_by']))
+    return tags
+
+def stream_doctor_patient_report(export_format):
+    # Streams the report one doctor at a time. NDJSON emits one line per doctor followed by a
+    # statistics line; CSV emits one row per doctor/patient pair (doctors without patients get
+    # empty patient columns) and leaves the statistics out.
+    if not User.query.filter_by(role='Doctor').first():
+        return jsonify({'error': 'No doctors found'}), 404
+
+    def generate_ndjson():
+        total_doctors = 0
+        total_patients = 0
+        for block in iter_doctor_patient_blocks():
+            total_doctors += 1
+            total_patients += len(block['patients'])
+            yield current_app.json.dumps(block) + '\n'
+        statistics = get_report_statistics(total_doctors, total_patients)
+        yield current_app.json.dumps({'statistics': statistics}) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['doctor_id', 'doctor_name', 'patient_id', 'patient_name'])
+        for block in iter_doctor_patient_blocks():
+            if not block['patients']:
+                writer.writerow([block['doctor_id'], block['doctor_name'], '', ''])
+            for patient in block['patients']:
+                writer.writerow([block['doctor_id'], block['doctor_name'], patient['id'], patient['name']])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    if export_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return Response(
+        stream_with_context(generate_csv()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=doctors-patients.csv'}
+    )
+
 @report_bp.route('/doctors-patients', methods=['GET'])
 @jwt_required()
 def generate_doctor_patient_report():
@@ -15,70 +78,65 @@ def generate_doctor_patient_report():
     if current_user['role'] != 'General Manager':
         return jsonify({'error': 'Unauthorized'}), 401
 
-    doctors = User.query.filter_by(role='Doctor').all()
-    if not doctors:
-        return jsonify({'error': 'No doctors found'}), 404
+    export_format = request.args.get('format', 'json')
+    if export_format in ('ndjson', 'csv'):
+        return stream_doctor_patient_report(export_format)
+    if export_format != 'json':
+        return jsonify({'error': 'format must be one of json, ndjson, csv'}), 400
 
-    from app.models.patient_assistant import PatientAssistant
-
-    report_data = []
-    total_patients = 0
-
-    for doctor in doctors:
-        patient_assignments = PatientAssistant.query.filter_by(doctor_id=doctor.id).all()
-        patient_ids = {pa.patient_id for pa in patient_assignments}  # Get unique patient IDs
+    report = report_cache.get_or_set(
+        report_cache_key(),
+        lambda: (build_doctor_patient_report(), [DOCTORS_PATIENTS_TAG])
+    )
+    if report is None:
+        return jsonify({'error': 'No doctors found'}), 404
 
-        patients = Patient.query.filter(Patient.id.in_(patient_ids)).all()
-        total_patients += len(patients)
+    return jsonify(report), 200
 
-        report_data.append({
-            'doctor_id': doctor.id,
-            'doctor_name': doctor.name,
-            'patients': [{'id': p.id, 'name': p.name} for p in patients]
-        })
 
-    total_doctors = len(doctors)
-    avg_patients_per_doctor = total_patients / total_doctors if total_doctors > 0 else 0
+def compute_doctor_patient_report_job():
+    report = build_doctor_patient_report()
+    if report is None:
+        raise LookupError('No doctors found')
+    return report
 
-    best_treatments = (
-        db.session.query(Treatment.name, func.count(PatientTreatment.id).label("usage_count"))
-        .join(PatientTreatment, Treatment.id == PatientTreatment.treatment_id)
-        .group_by(Treatment.id)
-        .order_by(func.count(PatientTreatment.id).desc())
-        .limit(3)
-        .all()
-    )
+@report_bp.route('/doctors-patients/jobs', methods=['POST'])
+@jwt_required()
+def submit_doctor_patient_report_job():
+    current_user = get_current_user()
+    if current_user['role'] != 'General Manager':
+        return jsonify({'error': 'Unauthorized'}), 401
 
-    best_treatments_list = [{'name': t[0], 'times_prescribed': t[1]} for t in best_treatments]
+    try:
+        job_id = report_jobs.submit('doctors-patients', compute_doctor_patient_report_job)
+    except ReportJobQueueFull:
+        return jsonify({'error': 'Too many report jobs in progress, try again later'}), 503
 
-    most_assigned_assistants = (
-        db.session.query(User.name, func.count(PatientAssistant.patient_id).label("assigned_patients"))
-        .join(PatientAssistant, User.id == PatientAssistant.assistant_id)
-        .group_by(User.id)
-        .order_by(func.count(PatientAssistant.patient_id).desc())
-        .limit(3)
-        .all()
-    )
+    return jsonify({'job_id': job_id, 'status': 'pending'}), 202
 
-    top_assistants = [{'name': a[0], 'patients_assigned': a[1]} for a in most_assigned_assistants]
 
-    applied_treatments = db.session.query(
-        func.avg(text("TIMESTAMPDIFF(HOUR, patient_treatments.prescribed_at, patient_treatments.applied_at)"))
-    ).filter(PatientTreatment.applied_at.isnot(None)).scalar()
+@report_bp.route('/doctors-patients/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_doctor_patient_report_job(job_id):
+    current_user = get_current_user()
+    if current_user['role'] != 'General Manager':
+        return jsonify({'error': 'Unauthorized'}), 401
 
-    avg_time_to_apply = round(applied_treatments, 2) if applied_treatments else 0
+    job = report_jobs.get(job_id)
+    if job is None or job['kind'] != 'doctors-patients':
+        return jsonify({'error': 'Report job not found or expired'}), 404
 
-    return jsonify({
-        'report': report_data,
-        'statistics': {
-            'total_doctors': total_doctors,
-            'total_patients': total_patients,
-            'avg_patients_per_doctor': round(avg_patients_per_doctor, 2),
-            'best_used_treatments': best_treatments_list,
-            'most_assigned_assistants': top_assistants,
-            'average_time_to_apply_treatment_hours': avg_time_to_apply
-        }
-    }), 200
+    response = {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'submitted_at': job['submitted_at'].strftime('%Y-%m-%d %H:%M:%S'),
+        'finished_at': job['finished_at'].strftime('%Y-%m-%d %H:%M:%S') if job['finished_at'] else None
+    }
+    if job['status'] == 'completed':
+        response['result'] = job['result']
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    return jsonify(response), 200
 
 
 @report_bp.route('/patient-treatments/<int:patient_id>', methods=['GET'])
@@ -88,8 +146,17 @@ def get_patient_treatments_report(patient_id):
     if current_user['role'] not in ['General Manager', 'Doctor']:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    patient = Patient.query.get(patient_id)
-    if not patient:
+    include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+    fields, fields_error = get_fields_arg(ARCHIVED_PATIENT_TREATMENT_FIELDS if include_archived else PATIENT_TREATMENT_FIELDS)
+    if fields_error:
+        return fields_error
+
+    def compute():
+        report = build_patient_treatments_report(patient_id, fields, include_archived)
+        return report, patient_treatments_report_tags(report) if report else ()
+
+    report = report_cache.get_or_set(report_cache_key(), compute)
+    if report is None:
         return jsonify({'error': 'Patient not found'}), 404
 
     if current_user['role'] == 'Doctor':
@@ -100,35 +167,85 @@ def get_patient_treatments_report(patient_id):
         if not supervising_relationship:
             return jsonify({'error': 'This doctor does not supervise the patient'}), 403
 
-    treatments = (
-        db.session.query(
-            Treatment.id,
-            Treatment.name,
-            Treatment.description,
-            PatientTreatment.prescribed_by,
-            PatientTreatment.applied_by,
-            PatientTreatment.applied_at,
-            PatientTreatment.status
-        )
-        .join(PatientTreatment, Treatment.id == PatientTreatment.treatment_id)
-        .filter(PatientTreatment.patient_id == patient_id)
-        .all()
-    )
+    return jsonify(report), 200
+
+
+@report_bp.route('/apply-latency', methods=['GET'])
+@jwt_required()
+def get_apply_latency_distribution():
+    current_user = get_current_user()
+    if current_user['role'] != 'General Manager':
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    group_by = request.args.get('group_by') or None
+    if group_by is not None and group_by not in GROUP_COLUMNS:
+        return jsonify({'error': 'group_by must be one of treatment, assistant, doctor'}), 400
+
+    bin_edges = None
+    if request.args.get('bins'):
+        try:
+            bin_edges = [float(edge) for edge in request.args['bins'].split(',')]
+        except ValueError:
+            return jsonify({'error': 'bins must be a comma separated list of hours'}), 400
+        # float() also accepts nan and inf, which the histogram arithmetic cannot bin.
+        if not all(math.isfinite(edge) for edge in bin_edges):
+            return jsonify({'error': 'bins must be finite numbers of hours'}), 400
+        if any(edge < 0 for edge in bin_edges) or len(set(bin_edges)) != len(bin_edges):
+            return jsonify({'error': 'bins must be distinct, non-negative hours'}), 400
+
+    return jsonify(compute_apply_latency_distribution(group_by, bin_edges)), 200
+
+
+@report_bp.route('/treatment-logs', methods=['GET'])
+@jwt_required()
+def get_treatment_logs():
+    current_user = get_current_user()
+    if current_user['role'] != 'General Manager':
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    limit, limit_error = get_limit_arg()
+    if limit_error:
+        return limit_error
+    try:
+        after = parse_treatment_log_cursor(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        return jsonify({'error': 'after must be a next_cursor returned by this endpoint'}), 400
+    fields, fields_error = get_fields_arg(TREATMENT_LOG_FIELDS)
+    if fields_error:
+        return fields_error
+
+    try:
+        patient_id = int(request.args['patient_id']) if request.args.get('patient_id') else None
+        assistant_id = int(request.args['assistant_id']) if request.args.get('assistant_id') else None
+    except ValueError:
+        return jsonify({'error': 'patient_id and assistant_id must be integers'}), 400
+    try:
+        applied_from = datetime.datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        applied_to = datetime.datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO 8601 dates or datetimes'}), 400
+    if applied_from and applied_to and applied_from >= applied_to:
+        return jsonify({'error': 'from must be earlier than to'}), 400
+
+    logs, next_cursor = query_treatment_logs(patient_id, assistant_id, applied_from, applied_to, fields, limit, after)
+    return jsonify({'logs': logs, 'next_cursor': next_cursor}), 200
+
+
+@report_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_report_cache_stats():
+    current_user = get_current_user()
+    if current_user['role'] != 'General Manager':
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify(report_cache.stats()), 200
+
+
+@report_bp.route('/treatment-log-writer-stats', methods=['GET'])
+@jwt_required()
+def get_treatment_log_writer_stats():
+    current_user = get_current_user()
+    if current_user['role'] != 'General Manager':
+        return jsonify({'error': 'Unauthorized'}), 401
 
-    treatment_list = []
-    for treatment in treatments:
-        treatment_list.append({
-            'id': treatment.id,
-            'name': treatment.name,
-            'description': treatment.description,
-            'prescribed_by': treatment.prescribed_by,
-            'applied_by': treatment.applied_by,
-            'applied_at': treatment.applied_at.strftime('%Y-%m-%d %H:%M:%S') if treatment.applied_at else None,
-            'status': treatment.status
-        })
-
-    return jsonify({
-        'patient_id': patient.id,
-        'patient_name': patient.name,
-        'treatments': treatment_list
-    }), 200
\ No newline at end of file
+    return jsonify(treatment_log_writer.stats()), 200
@@ -1,12 +1,18 @@
 import datetime
-from flask import Blueprint, request, jsonify
-from app import db
-from app.models import Treatment, Patient, PatientTreatment, PatientAssistant, TreatmentLog
+from collections import Counter
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy import insert
+from app import db, report_cache, treatment_catalog, treatment_log_writer
+from app.models import Treatment, Patient, PatientTreatment, PatientTreatmentArchive, PatientAssistant, TreatmentLog, TreatmentStatistic
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.utils import get_current_user, check_json, check_role, get_treatment_by_id, get_patient_by_id
+from app.utils import get_current_user, check_json, check_role, get_treatment_by_id, get_patient_by_id, get_pagination_args, get_fields_arg, get_bulk_items, chunked
+from app import statistics
+from app.report_cache import DOCTORS_PATIENTS_TAG, patient_tag, treatment_tag
 
 treatments_bp = Blueprint("treatments_bp", __name__)
 
+TREATMENT_FIELDS = ('id', 'name', 'description')
+
 @treatments_bp.route('/register', methods=['POST'])
 @jwt_required()
 def create_treatment():
@@ -29,7 +35,9 @@ def create_treatment():
 
     new_treatment = Treatment(name=data['name'], description=data['description'])
     db.session.add(new_treatment)
+    treatment_catalog.bump()
     db.session.commit()
+    treatment_catalog.invalidate()
 
     return jsonify({'message': 'Treatment created successfully'}), 201
 
@@ -37,19 +45,27 @@ def create_treatment():
 @treatments_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_all_treatments():
-    treatments = Treatment.query.all()
+    limit, after, page_error = get_pagination_args()
+    if page_error:
+        return page_error
+    fields, fields_error = get_fields_arg(TREATMENT_FIELDS)
+    if fields_error:
+        return fields_error
+
+    treatments, next_cursor = treatment_catalog.page(limit, after, fields)
     if not treatments:
         return jsonify({'message':'No treatments found'}), 204
-    return jsonify({'treatments': [{'id': t.id, 'name': t.name, 'description': t.description} for t in treatments]}), 200
+    return jsonify({
+        'treatments': [{field: getattr(t, field) for field in fields} for t in treatments],
+        'next_cursor': next_cursor
+    }), 200
 
 @treatments_bp.route('/<int:treatment_id>', methods=['GET'])
 @jwt_required()
 def get_treatment(treatment_id):
-    treatment = get_treatment_by_id(treatment_id)
+    treatment = treatment_catalog.get(treatment_id)
     if treatment is None:
         return jsonify({'error': 'Treatment not found'}), 404
-    if isinstance(treatment, dict):
-        return treatment
     return jsonify({'id': treatment.id, 'name': treatment.name, 'description': treatment.description}), 200
 
 @treatments_bp.route('/<int:treatment_id>', methods=['PUT'])
@@ -77,7 +93,10 @@ def update_treatment(treatment_id):
     if 'description' in data and data['description']:
         treatment.description = data['description']
 
+    treatment_catalog.bump()
     db.session.commit()
+    treatment_catalog.invalidate()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, treatment_tag(treatment_id))
     return jsonify({'message': 'Treatment updated successfully'}), 200
 
 @treatments_bp.route('/<int:treatment_id>', methods=['DELETE'])
@@ -93,14 +112,18 @@ def delete_treatment(treatment_id):
     if isinstance(treatment, dict):
         return treatment 
 
-    patient_treatments_to_delete = PatientTreatment.query.filter_by(treatment_id=treatment.id).all()
-    for pt in patient_treatments_to_delete:
-        db.session.delete(pt)
-
-    db.session.commit()
+    statistics.forget_patient_treatments(PatientTreatment.treatment_id == treatment.id)
+    statistics.forget_patient_treatments(PatientTreatmentArchive.treatment_id == treatment.id, model=PatientTreatmentArchive)
+    PatientTreatment.query.filter_by(treatment_id=treatment.id).delete(synchronize_session=False)
+    PatientTreatmentArchive.query.filter_by(treatment_id=treatment.id).delete(synchronize_session=False)
+    TreatmentLog.query.filter_by(treatment_id=treatment.id).delete(synchronize_session=False)
+    TreatmentStatistic.query.filter_by(treatment_id=treatment.id).delete(synchronize_session=False)
 
     db.session.delete(treatment)
+    treatment_catalog.bump()
     db.session.commit()
+    treatment_catalog.invalidate()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, treatment_tag(treatment_id))
 
     return jsonify({'message': 'Treatment deleted successfully'}), 200
 
@@ -121,7 +144,7 @@ def prescribe_treatment_to_patient(treatment_id, patient_id):
     if not supervising_relationship:
         return jsonify({'error': 'This doctor does not supervise the patient'}), 403
 
-    treatment = get_treatment(treatment_id)
+    treatment = treatment_catalog.get(treatment_id)
     if not treatment:
         return jsonify({'error': 'Treatment not found'}), 404
 
@@ -140,13 +163,98 @@ def prescribe_treatment_to_patient(treatment_id, patient_id):
         prescribed_at=datetime.datetime.now(),
     )
     db.session.add(new_patient_treatment)
+    statistics.record_prescriptions({treatment_id: 1})
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, patient_tag(patient_id))
 
     return jsonify({
         'message': f'Treatment {treatment_id} prescribed to Patient {patient_id} by Doctor {current_user["id"]}',
         'status': new_patient_treatment.status
     }), 201
 
+@treatments_bp.route('/prescribe/bulk', methods=['POST'])
+@jwt_required()
+def prescribe_treatments_bulk():
+    current_user = get_current_user()
+    if current_user['role'] != 'Doctor':
+        return jsonify({'error': 'Only a Doctor can prescribe treatments'}), 401
+    doctor_id = current_user['id']
+
+    treatment_ids, bulk_error = get_bulk_items('treatment_ids')
+    if bulk_error:
+        return bulk_error
+    patient_ids, bulk_error = get_bulk_items('patient_ids')
+    if bulk_error:
+        return bulk_error
+    # bool is a subclass of int: reject true/false explicitly.
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in treatment_ids + patient_ids):
+        return jsonify({'error': 'treatment_ids and patient_ids must contain integers'}), 400
+
+    # Duplicates are ignored; pairs are reported in request order.
+    treatment_ids = list(dict.fromkeys(treatment_ids))
+    patient_ids = list(dict.fromkeys(patient_ids))
+    max_items = current_app.config.get('BULK_MAX_ITEMS', 10000)
+    if len(treatment_ids) * len(patient_ids) > max_items:
+        return jsonify({'error': f'At most {max_items} treatment/patient pairs can be prescribed in one request'}), 413
+
+    # Set-based prefetch: treatments come from the catalog cache, then one query each for patients,
+    # supervision and existing prescriptions.
+    existing_treatments = treatment_catalog.existing_ids(treatment_ids)
+    existing_patients = {
+        patient_id for (patient_id,) in db.session.query(Patient.id).filter(Patient.id.in_(patient_ids)).all()
+    }
+    supervised = {
+        patient_id for (patient_id,) in (
+            db.session.query(PatientAssistant.patient_id)
+            .filter(PatientAssistant.doctor_id == doctor_id, PatientAssistant.patient_id.in_(existing_patients))
+            .distinct()
+            .all()
+        )
+    } if existing_patients else set()
+    prescribed = set(
+        db.session.query(PatientTreatment.patient_id, PatientTreatment.treatment_id)
+        .filter(PatientTreatment.patient_id.in_(supervised), PatientTreatment.treatment_id.in_(existing_treatments))
+        .all()
+    ) if supervised and existing_treatments else set()
+
+    results = []
+    new_rows = []
+    now = datetime.datetime.now()
+    for patient_id in patient_ids:
+        for treatment_id in treatment_ids:
+            result = {'patient_id': patient_id, 'treatment_id': treatment_id}
+            if patient_id not in existing_patients:
+                result.update(status='not_found', error='Patient not found')
+            elif patient_id not in supervised:
+                result.update(status='forbidden', error='This doctor does not supervise the patient')
+            elif treatment_id not in existing_treatments:
+                result.update(status='not_found', error='Treatment not found')
+            elif (patient_id, treatment_id) in prescribed:
+                result.update(status='already_prescribed')
+            else:
+                new_rows.append({
+                    'patient_id': patient_id,
+                    'treatment_id': treatment_id,
+                    'prescribed_by': doctor_id,
+                    'prescribed_at': now,
+                    'status': 'prescribed'
+                })
+                result.update(status='prescribed')
+            results.append(result)
+
+    for chunk in chunked(new_rows, current_app.config.get('BULK_INSERT_CHUNK_SIZE', 1000)):
+        db.session.execute(insert(PatientTreatment), chunk)
+    statistics.record_prescriptions(Counter(row['treatment_id'] for row in new_rows))
+    db.session.commit()
+    if new_rows:
+        report_cache.invalidate(DOCTORS_PATIENTS_TAG, *{patient_tag(row['patient_id']) for row in new_rows})
+
+    return jsonify({
+        'doctor_id': doctor_id,
+        'prescribed': len(new_rows),
+        'results': results
+    }), 201 if new_rows else 200
+
 @treatments_bp.route('/<int:treatment_id>/apply/<int:patient_id>', methods=['POST'])
 @jwt_required()
 def apply_treatment(patient_id, treatment_id):
@@ -166,7 +274,7 @@ def apply_treatment(patient_id, treatment_id):
     if not assistant_assignment:
         return jsonify({'error': 'This Assistant is not assigned to the patient'}), 403
 
-    treatment = Treatment.query.get(treatment_id)
+    treatment = treatment_catalog.get(treatment_id)
     if not treatment:
         return jsonify({'error': 'Treatment not found'}), 404
 
@@ -180,19 +288,122 @@ def apply_treatment(patient_id, treatment_id):
     if patient_treatment.status != 'prescribed':
         return jsonify({'error': 'This treatment has already been applied'}), 400
 
-    patient_treatment.applied_by = assistant_id
-    patient_treatment.applied_at = datetime.datetime.now()
-    patient_treatment.status = 'applied'
+    # The status check above is only a fast path: the conditional UPDATE decides the winner when
+    # several requests apply the same row concurrently, and the log row is written in the same
+    # transaction so an application is never recorded twice or without its log.
+    applied_at = datetime.datetime.now()
+    updated = (
+        PatientTreatment.query
+        .filter_by(id=patient_treatment.id, status='prescribed')
+        .update({'status': 'applied', 'applied_by': assistant_id, 'applied_at': applied_at}, synchronize_session=False)
+    )
+    if not updated:
+        db.session.rollback()
+        return jsonify({'error': 'This treatment has already been applied'}), 400
 
-    db.session.commit()
+    latency = statistics.apply_latency_hours(patient_treatment.prescribed_at, applied_at)
+    if latency is not None:
+        statistics.record_apply_latency(latency, 1, shard_key=assistant_id)
 
-    new_log = TreatmentLog(patient_id = patient_id, treatment_id = treatment_id, applied_by = assistant_id, applied_at = datetime.datetime.now())
-    db.session.add(new_log)
+    treatment_log_writer.write([{'patient_id': patient_id, 'treatment_id': treatment_id, 'applied_by': assistant_id, 'applied_at': applied_at}])
     db.session.commit()
+    report_cache.invalidate(DOCTORS_PATIENTS_TAG, patient_tag(patient_id))
 
     return jsonify({
         'message': f'Treatment {treatment_id} successfully applied to Patient {patient_id} by Assistant {assistant_id}',
-        'status': patient_treatment.status,
-        'applied_at': patient_treatment.applied_at
+        'status': 'applied',
+        'applied_at': applied_at
     }), 200
 
+@treatments_bp.route('/apply/bulk', methods=['POST'])
+@jwt_required()
+def apply_treatments_bulk():
+    current_user = get_current_user()
+    if current_user['role'] != 'Assistant':
+        return jsonify({'error': 'Only an Assistant can apply treatments'}), 403
+    assistant_id = current_user['id']
+
+    items, bulk_error = get_bulk_items('applications')
+    if bulk_error:
+        return bulk_error
+
+    pairs = []
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get('patient_id'), int) and isinstance(item.get('treatment_id'), int):
+            pairs.append((item['patient_id'], item['treatment_id']))
+        else:
+            pairs.append(None)
+    patient_ids = {pair[0] for pair in pairs if pair}
+    treatment_ids = {pair[1] for pair in pairs if pair}
+
+    # Set-based prefetch: the assistant's assignments and the matching prescriptions, the latter
+    # locked so concurrent applies of the same rows wait for this transaction.
+    assigned = {
+        patient_id for (patient_id,) in (
+            db.session.query(PatientAssistant.patient_id)
+            .filter(PatientAssistant.assistant_id == assistant_id, PatientAssistant.patient_id.in_(patient_ids))
+            .all()
+        )
+    } if patient_ids else set()
+    prescriptions = {}
+    if assigned and treatment_ids:
+        rows = (
+            db.session.query(PatientTreatment.id, PatientTreatment.patient_id, PatientTreatment.treatment_id,
+                             PatientTreatment.status, PatientTreatment.prescribed_at)
+            .filter(PatientTreatment.patient_id.in_(assigned), PatientTreatment.treatment_id.in_(treatment_ids))
+            .with_for_update()
+            .all()
+        )
+        for row in rows:
+            prescriptions.setdefault((row.patient_id, row.treatment_id), row)
+
+    now = datetime.datetime.now()
+    results = []
+    applied_ids = []
+    applied_pairs = set()
+    new_logs = []
+    total_hours = 0
+    latency_count = 0
+    for index, pair in enumerate(pairs):
+        if pair is None:
+            results.append({'index': index, 'status': 'invalid', 'error': 'patient_id and treatment_id must be integers'})
+            continue
+        patient_id, treatment_id = pair
+        result = {'index': index, 'patient_id': patient_id, 'treatment_id': treatment_id}
+        prescription = prescriptions.get(pair)
+        if patient_id not in assigned:
+            result.update(status='forbidden', error='This Assistant is not assigned to the patient')
+        elif prescription is None:
+            result.update(status='not_found', error='Treatment is not prescribed to this patient')
+        elif prescription.status != 'prescribed' or pair in applied_pairs:
+            result.update(status='already_applied')
+        else:
+            applied_ids.append(prescription.id)
+            applied_pairs.add(pair)
+            new_logs.append({'patient_id': patient_id, 'treatment_id': treatment_id, 'applied_by': assistant_id, 'applied_at': now})
+            latency = statistics.apply_latency_hours(prescription.prescribed_at, now)
+            if latency is not None:
+                total_hours += latency
+                latency_count += 1
+            result.update(status='applied')
+        results.append(result)
+
+    chunk_size = current_app.config.get('BULK_INSERT_CHUNK_SIZE', 1000)
+    for chunk in chunked(applied_ids, chunk_size):
+        (
+            db.session.query(PatientTreatment)
+            .filter(PatientTreatment.id.in_(chunk), PatientTreatment.status == 'prescribed')
+            .update({'status': 'applied', 'applied_by': assistant_id, 'applied_at': now}, synchronize_session=False)
+        )
+    for chunk in chunked(new_logs, chunk_size):
+        treatment_log_writer.write(chunk)
+    statistics.record_apply_latency(total_hours, latency_count, shard_key=assistant_id)
+    db.session.commit()
+    if applied_ids:
+        report_cache.invalidate(DOCTORS_PATIENTS_TAG, *{patient_tag(patient_id) for patient_id, _ in applied_pairs})
+
+    return jsonify({
+        'applied': len(applied_ids),
+        'applied_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results
+    }), 200
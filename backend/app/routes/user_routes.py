@@ -0,0 +1,41 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from app.models import User
+from app import db
+from app.utils import check_role, escape_like, paginate_by_name, get_limit_arg
+
+users_bp = Blueprint('users_bp', __name__)
+
+USER_ROLES = User.__table__.c.role.type.enums
+
+@users_bp.route('/', methods=['GET'])
+@jwt_required()
+def get_users():
+    role_error = check_role(['General Manager'])
+    if role_error:
+        return role_error
+
+    role = request.args.get('role')
+    if role is not None and role not in USER_ROLES:
+        return jsonify({'error': f'role must be one of: {", ".join(USER_ROLES)}'}), 400
+
+    limit, limit_error = get_limit_arg()
+    if limit_error:
+        return limit_error
+
+    # Pages are ordered by name and the cursor is the last name returned, so role, name prefix
+    # and cursor together are a single range seek on the (role, name) or (name) index.
+    query = db.session.query(User.id, User.name, User.role)
+    if role is not None:
+        query = query.filter(User.role == role)
+    name = (request.args.get('name') or '').strip()
+    if name:
+        query = query.filter(User.name.like(escape_like(name) + '%', escape='/'))
+
+    users, next_cursor = paginate_by_name(query, User.name, limit, request.args.get('after') or None)
+    if not users:
+        return jsonify({'message': 'No users found'}), 204
+    return jsonify({
+        'users': [{'id': u.id, 'name': u.name, 'role': u.role} for u in users],
+        'next_cursor': next_cursor
+    }), 200
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import os
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+from app.models import User
+from app import db, password_hasher, report_cache
+from app.utils import chunked
+from app.report_cache import DOCTORS_PATIENTS_TAG
+
+STAFF_ROLES = User.__table__.c.role.type.enums
+STAFF_FILE_FORMATS = ('json', 'csv')
+
+def read_staff_file(content, file_format):
+    # Parses a staff file into a list of rows. JSON files hold a list of {name, password, role}
+    # objects (or {"staff": [...]}); CSV files have a name,password,role header.
+    # Raises ValueError when the file cannot be parsed.
+    if file_format == 'csv':
+        return list(csv.DictReader(io.StringIO(content)))
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as error:
+        raise ValueError(f'Invalid JSON: {error}')
+    if isinstance(data, dict):
+        data = data.get('staff')
+    if not isinstance(data, list):
+        raise ValueError('JSON staff file must hold a list of users or a "staff" list')
+    return data
+
+def import_staff(rows):
+    # Creates the users described by `rows` in one transaction and returns the per-row results.
+    # Names are checked against the batch and against existing users with a single query,
+    # passwords are hashed in parallel on the hashing pool and rows are inserted in chunks.
+    # Invalid or duplicate rows are reported and skipped; the other rows are created.
+    results = []
+    names = set()
+    for index, row in enumerate(rows):
+        row = row if isinstance(row, dict) else {}
+        name, password, role = row.get('name'), row.get('password'), row.get('role')
+        if not isinstance(name, str) or not name.strip():
+            results.append({'index': index, 'status': 'invalid', 'error': 'Name field must be filled'})
+        elif not isinstance(password, str) or not password:
+            results.append({'index': index, 'name': name, 'status': 'invalid', 'error': 'Password field must be filled'})
+        elif role not in STAFF_ROLES:
+            results.append({'index': index, 'name': name, 'status': 'invalid', 'error': f'Role must be one of: {", ".join(STAFF_ROLES)}'})
+        elif name.casefold() in names:
+            # Case-insensitive, as the unique name index is on MySQL.
+            results.append({'index': index, 'name': name, 'status': 'duplicate', 'error': 'Name repeated in this batch'})
+        else:
+            names.add(name.casefold())
+            results.append({'index': index, 'name': name, 'status': 'created', '_password': password, 'role': role})
+
+    # One query for every duplicate against existing users.
+    candidates = [result['name'] for result in results if result['status'] == 'created']
+    existing = {
+        name.casefold() for (name,) in db.session.query(User.name).filter(User.name.in_(candidates)).all()
+    } if candidates else set()
+    new_users = []
+    for result in results:
+        if result['status'] != 'created':
+            continue
+        if result['name'].casefold() in existing:
+            result['status'] = 'duplicate'
+            result['error'] = 'User with this name already exists'
+            del result['_password'], result['role']
+        else:
+            new_users.append(result)
+
+    password_hashes = password_hasher.hash_many([result.pop('_password') for result in new_users])
+    rows = [
+        {'name': result['name'], 'role': result['role'], 'password_hash': password_hash}
+        for result, password_hash in zip(new_users, password_hashes)
+    ]
+
+    # Multi-row INSERTs in chunks, all in one transaction.
+    for chunk in chunked(rows, current_app.config.get('BULK_INSERT_CHUNK_SIZE', 1000)):
+        db.session.execute(insert(User), chunk)
+    db.session.flush()
+
+    new_names = [row['name'] for row in rows]
+    ids = dict(
+        db.session.query(User.name, User.id).filter(User.name.in_(new_names)).all()
+    ) if new_names else {}
+    db.session.commit()
+    if new_users:
+        report_cache.invalidate(DOCTORS_PATIENTS_TAG)
+
+    for result in new_users:
+        result['id'] = ids.get(result['name'])
+    return results
+
+@click.command('import-staff')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(STAFF_FILE_FORMATS), default=None,
+              help='File format (default: from the file extension).')
+@with_appcontext
+def import_staff_command(path, file_format):
+    """Create doctors, assistants and managers from a JSON or CSV file."""
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if file_format not in STAFF_FILE_FORMATS:
+        raise click.ClickException('Cannot tell the file format from its extension; pass --format json or csv.')
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        try:
+            rows = read_staff_file(f.read(), file_format)
+        except ValueError as error:
+            raise click.ClickException(str(error))
+
+    results = import_staff(rows)
+    created = sum(1 for result in results if result['status'] == 'created')
+    for result in results:
+        if result['status'] != 'created':
+            click.echo(f"Row {result['index']} ({result.get('name', '')}): {result['error']}")
+    click.echo(f'{created} user(s) created, {len(results) - created} row(s) failed.')
@@ -0,0 +1,238 @@
+import threading
+import click
+from decimal import Decimal
+from flask.cli import with_appcontext
+from sqlalchemy import func, cast, Integer, insert, select, union_all
+from sqlalchemy.sql import text
+from app.models import (
+    User, Treatment, PatientTreatment, PatientTreatmentArchive, PatientAssistant,
+    TreatmentStatistic, AssistantStatistic, ApplyLatencyStatistic
+)
+from app import db
+from app.utils import add_or_insert
+
+# The running latency sum is spread over this many rows so concurrent applies rarely update the
+# same one; readers add them up.
+LATENCY_SHARDS = 16
+
+SQLITE_UNITS_PER_DAY = {'HOUR': 24, 'SECOND': 86400}
+
+def apply_latency_expression(unit, model=PatientTreatment):
+    # Whole units between prescription and application, truncated like MySQL's TIMESTAMPDIFF(unit, ...).
+    if db.engine.dialect.name == 'sqlite':
+        return cast(
+            (func.julianday(model.applied_at) - func.julianday(model.prescribed_at))
+            * SQLITE_UNITS_PER_DAY[unit],
+            Integer
+        )
+    return func.timestampdiff(text(unit), model.prescribed_at, model.applied_at)
+
+def apply_latency_hours_expression(model=PatientTreatment):
+    return apply_latency_expression('HOUR', model)
+
+def apply_latency_hours(prescribed_at, applied_at):
+    # Python counterpart of apply_latency_hours_expression for a single row.
+    if prescribed_at is None or applied_at is None:
+        return None
+    return int((applied_at - prescribed_at).total_seconds() / 3600)
+
+def _add_counts(model, key_column, value_column, deltas):
+    # Adds each delta to the counter row of its key, creating the row when it does not exist yet.
+    # Keys are sorted so concurrent writers lock the rows in the same order.
+    rows = [
+        {key_column.key: key, value_column.key: delta}
+        for key, delta in sorted((key, delta) for key, delta in deltas.items() if key is not None and delta)
+    ]
+    add_or_insert(model, [key_column.key], rows)
+
+def record_prescriptions(deltas):
+    # deltas: {treatment_id: change in number of prescriptions}
+    _add_counts(TreatmentStatistic, TreatmentStatistic.treatment_id, TreatmentStatistic.times_prescribed, deltas)
+
+def record_assignments(deltas):
+    # deltas: {assistant_id: change in number of assigned patients}
+    _add_counts(AssistantStatistic, AssistantStatistic.assistant_id, AssistantStatistic.patients_assigned, deltas)
+
+def record_apply_latency(total_hours, applied_count, shard_key=None):
+    # shard_key (e.g. the applying assistant's id) picks the row; by default the current thread's.
+    if not applied_count:
+        return
+    shard_key = threading.get_ident() if shard_key is None else shard_key
+    add_or_insert(ApplyLatencyStatistic, ['id'], [
+        {'id': hash(shard_key) % LATENCY_SHARDS, 'total_hours': total_hours, 'applied_count': applied_count}
+    ])
+
+def forget_patient_treatments(*criteria, model=PatientTreatment):
+    # Removes the contribution of the PatientTreatment (or PatientTreatmentArchive, with `model`)
+    # rows matching criteria. Call before deleting them.
+    counts = (
+        db.session.query(model.treatment_id, func.count(model.id))
+        .filter(*criteria)
+        .group_by(model.treatment_id)
+        .all()
+    )
+    record_prescriptions({treatment_id: -count for treatment_id, count in counts})
+
+    latency = apply_latency_hours_expression(model)
+    total_hours, applied_count = (
+        db.session.query(func.coalesce(func.sum(latency), 0), func.count(latency))
+        .filter(*criteria, model.applied_at.isnot(None))
+        .one()
+    )
+    record_apply_latency(-int(total_hours), -applied_count)
+
+def forget_patient_assistants(*criteria):
+    # Removes the contribution of the PatientAssistant rows matching criteria. Call before deleting them.
+    counts = (
+        db.session.query(PatientAssistant.assistant_id, func.count(PatientAssistant.patient_id))
+        .filter(*criteria)
+        .group_by(PatientAssistant.assistant_id)
+        .all()
+    )
+    record_assignments({assistant_id: -count for assistant_id, count in counts})
+
+def average_apply_hours(total_hours, applied_count):
+    # Matches the rounding of the former AVG(TIMESTAMPDIFF(...)) query, including its Decimal type.
+    if not applied_count:
+        return 0
+    average = round(Decimal(total_hours) / Decimal(applied_count), 2)
+    return average if average else 0
+
+def get_top_treatments(limit=3):
+    return (
+        db.session.query(Treatment.name, TreatmentStatistic.times_prescribed)
+        .join(TreatmentStatistic, Treatment.id == TreatmentStatistic.treatment_id)
+        .filter(TreatmentStatistic.times_prescribed > 0)
+        .order_by(TreatmentStatistic.times_prescribed.desc())
+        .limit(limit)
+        .all()
+    )
+
+def get_top_assistants(limit=3):
+    return (
+        db.session.query(User.name, AssistantStatistic.patients_assigned)
+        .join(AssistantStatistic, User.id == AssistantStatistic.assistant_id)
+        .filter(AssistantStatistic.patients_assigned > 0)
+        .order_by(AssistantStatistic.patients_assigned.desc())
+        .limit(limit)
+        .all()
+    )
+
+def _stored_latency():
+    total_hours, applied_count = db.session.query(
+        func.coalesce(func.sum(ApplyLatencyStatistic.total_hours), 0),
+        func.coalesce(func.sum(ApplyLatencyStatistic.applied_count), 0)
+    ).one()
+    return int(total_hours), int(applied_count)
+
+def get_average_apply_hours():
+    return average_apply_hours(*_stored_latency())
+
+def _live_treatment_counts():
+    # Archived prescriptions still count: archiving moves rows, it does not forget them.
+    prescriptions = union_all(
+        select(PatientTreatment.treatment_id.label('treatment_id')),
+        select(PatientTreatmentArchive.treatment_id)
+    ).subquery()
+    return (
+        select(prescriptions.c.treatment_id, func.count())
+        .join(Treatment, Treatment.id == prescriptions.c.treatment_id)
+        .group_by(prescriptions.c.treatment_id)
+    )
+
+def _live_assistant_counts():
+    return (
+        select(PatientAssistant.assistant_id, func.count(PatientAssistant.patient_id))
+        .join(User, User.id == PatientAssistant.assistant_id)
+        .group_by(PatientAssistant.assistant_id)
+        .having(func.count(PatientAssistant.patient_id) > 0)
+    )
+
+def _live_latency():
+    total_hours, applied_count = 0, 0
+    for model in (PatientTreatment, PatientTreatmentArchive):
+        latency = apply_latency_hours_expression(model)
+        model_hours, model_count = (
+            db.session.query(func.coalesce(func.sum(latency), 0), func.count(latency))
+            .filter(model.applied_at.isnot(None))
+            .one()
+        )
+        total_hours += int(model_hours)
+        applied_count += model_count
+    return total_hours, applied_count
+
+def compute_live_statistics():
+    # Full-scan computation of the counters, used to rebuild and verify the summary tables.
+    return {
+        'treatments': {k: v for k, v in db.session.execute(_live_treatment_counts()).all()},
+        'assistants': {k: v for k, v in db.session.execute(_live_assistant_counts()).all()},
+        'latency': _live_latency()
+    }
+
+def read_stored_statistics():
+    return {
+        'treatments': {
+            s.treatment_id: s.times_prescribed
+            for s in TreatmentStatistic.query.filter(TreatmentStatistic.times_prescribed != 0)
+        },
+        'assistants': {
+            s.assistant_id: s.patients_assigned
+            for s in AssistantStatistic.query.filter(AssistantStatistic.patients_assigned != 0)
+        },
+        'latency': _stored_latency()
+    }
+
+def check_statistics():
+    # Returns a list of human readable differences between the summary tables and the live values.
+    stored = read_stored_statistics()
+    live = compute_live_statistics()
+    mismatches = []
+    for section in ('treatments', 'assistants'):
+        for key in sorted(set(stored[section]) | set(live[section])):
+            if stored[section].get(key, 0) != live[section].get(key, 0):
+                mismatches.append(
+                    f'{section}[{key}]: stored {stored[section].get(key, 0)}, live {live[section].get(key, 0)}'
+                )
+    if stored['latency'] != live['latency']:
+        mismatches.append(f'latency (total_hours, applied_count): stored {stored["latency"]}, live {live["latency"]}')
+    return mismatches
+
+def rebuild_statistics():
+    # Recomputes every summary table from scratch in one transaction.
+    ApplyLatencyStatistic.query.delete()
+    TreatmentStatistic.query.delete()
+    AssistantStatistic.query.delete()
+
+    db.session.execute(
+        insert(TreatmentStatistic).from_select(
+            ['treatment_id', 'times_prescribed'], _live_treatment_counts()
+        )
+    )
+    db.session.execute(
+        insert(AssistantStatistic).from_select(
+            ['assistant_id', 'patients_assigned'], _live_assistant_counts()
+        )
+    )
+    total_hours, applied_count = _live_latency()
+    db.session.add(ApplyLatencyStatistic(id=0, total_hours=total_hours, applied_count=applied_count))
+    db.session.commit()
+
+@click.command('rebuild-statistics')
+@click.option('--check-only', is_flag=True, help='Only compare the summary tables with the live values.')
+@with_appcontext
+def rebuild_statistics_command(check_only):
+    """Rebuild the report statistics tables and verify them against the live data."""
+    mismatches = check_statistics()
+    for mismatch in mismatches:
+        click.echo(f'Drift: {mismatch}')
+    if check_only:
+        click.echo('Statistics are consistent.' if not mismatches else f'{len(mismatches)} mismatch(es) found.')
+        raise SystemExit(1 if mismatches else 0)
+
+    rebuild_statistics()
+    remaining = check_statistics()
+    for mismatch in remaining:
+        click.echo(f'Mismatch after rebuild: {mismatch}')
+    if remaining:
+        raise SystemExit(1)
+    click.echo('Statistics rebuilt and verified.')
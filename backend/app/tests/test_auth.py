@@ -61,3 +61,291 @@ def test_register_duplicate_user(client, auth_headers_manager, test_user):
         "role": "Doctor"
     })
     assert response.status_code == 400
+
+def test_login_rehashes_outdated_password_hash(app, client):
+    from werkzeug.security import generate_password_hash
+    from app import db, password_hasher
+    from app.models import User
+
+    user = User(name="legacy", password_hash=generate_password_hash("secret", "pbkdf2:sha256:1000"), role="Doctor")
+    db.session.add(user)
+    db.session.commit()
+    assert password_hasher.needs_rehash(user.password_hash)
+
+    response = client.post('/api/auth/login', json={"name": "legacy", "password": "secret"})
+    assert response.status_code == 200
+    db.session.expire_all()
+    upgraded = db.session.get(User, user.id).password_hash
+    assert upgraded.startswith(password_hasher.method + '$')
+    assert not password_hasher.needs_rehash(upgraded)
+
+    # The upgraded hash keeps working and is not rehashed again.
+    response = client.post('/api/auth/login', json={"name": "legacy", "password": "secret"})
+    assert response.status_code == 200
+    assert db.session.get(User, user.id).password_hash == upgraded
+
+def test_login_rejected_when_hashing_pool_is_full(app, client, test_user):
+    from app import password_hasher
+    password_hasher._pending = password_hasher.max_pending
+    try:
+        response = client.post('/api/auth/login', json={"name": "testuser", "password": "testpassword"})
+    finally:
+        password_hasher._pending = 0
+    assert response.status_code == 503
+
+def test_password_changes_rejected_when_hashing_pool_is_full(app, client, auth_headers_manager, doctor):
+    from app import password_hasher
+    password_hasher._pending = password_hasher.max_pending
+    try:
+        response = client.post('/api/auth/register', headers=auth_headers_manager, json={
+            "name": "newuser", "password": "newpassword", "role": "Doctor"
+        })
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        response = client.put(f'/api/doctors/{doctor.id}', headers=auth_headers_manager, json={"name": "renamed", "password": "new"})
+        assert response.status_code == 503
+    finally:
+        password_hasher._pending = 0
+    assert User.query.filter_by(name="renamed").first() is None
+
+def test_login_succeeds_when_rehash_pool_is_full(app, client, monkeypatch):
+    from app import password_hasher
+    from app.password_hasher import PasswordHasherBusy
+
+    user = User(name="legacy", password_hash=generate_password_hash("secret", "pbkdf2:sha256:1000"), role="Doctor")
+    db.session.add(user)
+    db.session.commit()
+    legacy_hash = user.password_hash
+
+    def busy(password):
+        raise PasswordHasherBusy()
+    monkeypatch.setattr(password_hasher, 'hash', busy)
+    response = client.post('/api/auth/login', json={"name": "legacy", "password": "secret"})
+    assert response.status_code == 200
+    assert db.session.get(User, user.id).password_hash == legacy_hash
+
+def test_refresh_token_flow(app, client, test_user):
+    response = client.post('/api/auth/login', json={"name": "testuser", "password": "testpassword"})
+    refresh_token = response.json["refresh_token"]
+    refresh_headers = {"Authorization": f"Bearer {refresh_token}"}
+
+    response = client.post('/api/auth/refresh', headers=refresh_headers)
+    assert response.status_code == 200
+    access_headers = {"Authorization": f"Bearer {response.json['access_token']}"}
+    assert client.get('/api/doctors/', headers=access_headers).status_code in (200, 204)
+
+    # Access tokens cannot be used to refresh.
+    assert client.post('/api/auth/refresh', headers=access_headers).status_code == 422
+
+    response = client.post('/api/auth/logout', headers=refresh_headers)
+    assert response.status_code == 200
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 401
+
+def test_revocations_from_other_workers_are_loaded(app, client, test_user):
+    import datetime
+    from flask_jwt_extended import decode_token
+    from app import db, token_revocations
+    from app.models import RevokedToken
+
+    response = client.post('/api/auth/login', json={"name": "testuser", "password": "testpassword"})
+    refresh_token = response.json["refresh_token"]
+    refresh_headers = {"Authorization": f"Bearer {refresh_token}"}
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 200
+
+    # Another worker revokes the token: this worker picks it up on its next sync.
+    db.session.add(RevokedToken(jti=decode_token(refresh_token)["jti"], expires_at=datetime.datetime.now() + datetime.timedelta(days=1)))
+    db.session.commit()
+    token_revocations.refresh_seconds = 0
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 401
+
+def test_login_throttled_before_password_check(app, client, test_user, monkeypatch):
+    from app import password_hasher, login_throttle
+
+    verified = []
+    verify = password_hasher.verify
+    monkeypatch.setattr(password_hasher, 'verify', lambda *args: verified.append(1) or verify(*args))
+
+    # Successful logins are refunded: a burst of them from one kiosk is never throttled.
+    for _ in range(login_throttle.user_capacity * 2):
+        response = client.post('/api/auth/login', json={"name": "testuser", "password": "testpassword"})
+        assert response.status_code == 200
+    verified.clear()
+
+    for _ in range(login_throttle.user_capacity):
+        response = client.post('/api/auth/login', json={"name": "testuser", "password": "wrongpassword"})
+        assert response.status_code == 401
+
+    # The bucket of this username is empty: rejected without hashing, even with the right password.
+    response = client.post('/api/auth/login', json={"name": "TestUser", "password": "testpassword"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert len(verified) == login_throttle.user_capacity
+
+    # Other usernames from the same address still get through.
+    response = client.post('/api/auth/login', json={"name": "unknownuser", "password": "testpassword"})
+    assert response.status_code == 404
+
+def test_login_throttle_memory_buckets_expire():
+    from app.login_throttle import MemoryBuckets
+
+    buckets = MemoryBuckets(max_keys=2)
+    limits = lambda key: [(key, 2, 1.0)]
+    assert buckets.take(limits('a'), 0) == 0
+    assert buckets.take(limits('a'), 0) == 0
+    assert buckets.take(limits('a'), 0) == 1.0
+    assert buckets.take(limits('a'), 0.5) == 0.5
+    assert buckets.take(limits('a'), 1) == 0
+
+    # Buckets idle long enough to be full again are dropped; the oldest is evicted past max_keys.
+    assert buckets.take(limits('b'), 3) == 0
+    assert list(buckets._buckets) == ['b']
+    buckets.take(limits('c'), 3)
+    buckets.take(limits('d'), 3)
+    assert list(buckets._buckets) == ['c', 'd']
+
+def test_login_throttle_database_backend_is_shared(app, client, test_user):
+    import time
+    from app import login_throttle
+    from app.login_throttle import DatabaseBuckets, bucket_key
+    from app.models import LoginThrottleBucket
+
+    app.config['LOGIN_THROTTLE_BACKEND'] = 'database'
+    app.config['LOGIN_THROTTLE_USER_CAPACITY'] = 2
+    login_throttle.init_app(app)
+    assert isinstance(login_throttle.backend, DatabaseBuckets)
+
+    for _ in range(3):
+        response = client.post('/api/auth/login', json={"name": "testuser", "password": "testpassword"})
+        assert response.status_code == 200
+    assert LoginThrottleBucket.query.get(bucket_key('user', 'testuser')).tokens >= 1
+    for _ in range(2):
+        response = client.post('/api/auth/login', json={"name": "testuser", "password": "wrongpassword"})
+        assert response.status_code == 401
+    assert client.post('/api/auth/login', json={"name": "testuser", "password": "testpassword"}).status_code == 429
+
+    # A second worker sees the same buckets.
+    other = DatabaseBuckets()
+    limits = [(bucket_key('user', 'testuser'), 2, login_throttle.user_refill_per_second)]
+    assert other.take(limits, time.time()) > 0
+    assert LoginThrottleBucket.query.get(bucket_key('user', 'testuser')).tokens < 1
+
+    # Keys have a fixed size whatever the length of the name.
+    response = client.post('/api/auth/login', json={"name": "x" * 5000, "password": "testpassword"})
+    assert response.status_code == 404
+    assert {len(bucket.key) for bucket in LoginThrottleBucket.query.all()} == {69}
+
+def test_register_bulk_json(app, client, auth_headers_manager, test_user):
+    from app import password_hasher
+    from app.models import User
+
+    response = client.post('/api/auth/register/bulk', headers=auth_headers_manager, json={"staff": [
+        {"name": "Dr. One", "password": "secret1", "role": "Doctor"},
+        {"name": "Nurse Two", "password": "secret2", "role": "Assistant"},
+        {"name": "testuser", "password": "secret3", "role": "Doctor"},
+        {"name": "DR. ONE", "password": "secret4", "role": "Doctor"},
+        {"name": "No Password", "role": "Doctor"},
+        {"name": "Bad Role", "password": "secret5", "role": "Janitor"}
+    ]})
+    assert response.status_code == 201
+    assert response.json["created"] == 2
+    assert [r["status"] for r in response.json["results"]] == ["created", "created", "duplicate", "duplicate", "invalid", "invalid"]
+    assert all("_password" not in r for r in response.json["results"])
+
+    doctor = User.query.filter_by(name="Dr. One").one()
+    assert doctor.role == "Doctor" and doctor.id == response.json["results"][0]["id"]
+    assert password_hasher.verify(doctor.password_hash, "secret1")
+
+def test_bulk_hashing_does_not_use_the_login_pool(app):
+    from app import password_hasher
+    password_hasher.workers = password_hasher.bulk_workers = 1
+    hashes = password_hasher.hash_many(["one", "two"])
+    assert password_hasher._bulk_executor is not None
+    assert password_hasher._executor is None
+    assert password_hasher._pending == 0
+    assert password_hasher.verify(hashes[1], "two")
+
+def test_register_bulk_csv_upload(app, client, auth_headers_manager):
+    import io
+    from app.models import User
+
+    content = "name,password,role\nDr. Csv,secret,Doctor\nAssistant Csv,secret,Assistant\n,secret,Doctor\n"
+    response = client.post('/api/auth/register/bulk', headers=auth_headers_manager,
+                           data={"file": (io.BytesIO(content.encode()), "staff.csv")}, content_type="multipart/form-data")
+    assert response.status_code == 201
+    assert response.json["created"] == 2 and response.json["failed"] == 1
+    assert User.query.filter(User.name.in_(["Dr. Csv", "Assistant Csv"])).count() == 2
+
+    response = client.post('/api/auth/register/bulk', headers=auth_headers_manager,
+                           data={"file": (io.BytesIO(b"{}"), "staff.txt")}, content_type="multipart/form-data")
+    assert response.status_code == 400
+
+def test_register_bulk_non_manager(client, auth_headers_doctor):
+    response = client.post('/api/auth/register/bulk', headers=auth_headers_doctor, json={"staff": [
+        {"name": "Dr. One", "password": "secret1", "role": "Doctor"}
+    ]})
+    assert response.status_code == 401
+
+def test_import_staff_command(app, tmp_path):
+    from app.models import User
+
+    path = tmp_path / "staff.json"
+    path.write_text(json.dumps([
+        {"name": "Dr. Cli", "password": "secret", "role": "Doctor"},
+        {"name": "Dr. Cli", "password": "secret", "role": "Doctor"}
+    ]))
+    result = app.test_cli_runner().invoke(args=['import-staff', str(path)])
+    assert result.exit_code == 0
+    assert "1 user(s) created, 1 row(s) failed." in result.output
+    assert "Name repeated in this batch" in result.output
+    assert User.query.filter_by(name="Dr. Cli").count() == 1
+
+def test_revocations_committed_out_of_id_order_are_loaded(app):
+    import datetime
+    from app import db, token_revocations
+    from app.models import RevokedToken
+
+    expires_at = datetime.datetime.now() + datetime.timedelta(days=1)
+    token_revocations.refresh_seconds = 0
+    db.session.add(RevokedToken(id=11, jti="later-id-committed-first", expires_at=expires_at))
+    db.session.commit()
+    assert token_revocations.is_revoked({}, {"jti": "later-id-committed-first"})
+
+    # A revocation with a lower id that commits after the sync above is still picked up.
+    db.session.add(RevokedToken(id=10, jti="earlier-id-committed-later", expires_at=expires_at))
+    db.session.commit()
+    assert token_revocations.is_revoked({}, {"jti": "earlier-id-committed-later"})
+
+def test_refresh_rejected_after_user_deleted(app, client, auth_headers_manager, doctor):
+    response = client.post('/api/auth/login', json={"name": "doctor1", "password": "password"})
+    refresh_headers = {"Authorization": f"Bearer {response.json['refresh_token']}"}
+    access_headers = {"Authorization": f"Bearer {response.json['access_token']}"}
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 200
+
+    assert client.delete(f'/api/doctors/{doctor.id}', headers=auth_headers_manager).status_code == 200
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 401
+    assert client.get('/api/patients/', headers=access_headers).status_code == 401
+
+def test_refresh_rejected_after_role_change(app, client, auth_headers_manager, doctor):
+    import time
+    from app import token_revocations
+    from app.models import UserTokenCutoff
+
+    response = client.post('/api/auth/login', json={"name": "doctor1", "password": "password"})
+    refresh_headers = {"Authorization": f"Bearer {response.json['refresh_token']}"}
+
+    response = client.put(f'/api/doctors/{doctor.id}', headers=auth_headers_manager, json={"role": "Assistant"})
+    assert response.status_code == 200
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 401
+
+    # Other workers load the cutoff from the database.
+    assert db.session.get(UserTokenCutoff, doctor.id) is not None
+    token_revocations._cutoffs.clear()
+    token_revocations.refresh_seconds = 0
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 401
+
+    # Tokens issued after the change work.
+    time.sleep(1)
+    response = client.post('/api/auth/login', json={"name": "doctor1", "password": "password"})
+    refresh_headers = {"Authorization": f"Bearer {response.json['refresh_token']}"}
+    response = client.post('/api/auth/refresh', headers=refresh_headers)
+    assert response.status_code == 200
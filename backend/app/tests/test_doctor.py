@@ -54,3 +54,23 @@ def test_delete_non_existent_doctor(client, auth_headers_manager):
 def test_delete_doctor_unauthorized(client, doctor):
     response = client.delete(f'/api/doctors/{doctor.id}')
     assert response.status_code == 401
+
+def test_get_doctors_keyset_pagination(client, auth_headers_manager, doctor):
+    response = client.get('/api/doctors/?limit=1', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert response.json["doctors"] == [{"id": doctor.id, "name": "doctor1"}]
+    assert response.json["next_cursor"] is None
+
+def test_delete_doctor_detaches_references(app, client, auth_headers_manager, doctor, assistant, patient, treatment, doctor_assistant_patient_association):
+    from app import db
+    from app.models import PatientAssistant, PatientTreatment
+
+    db.session.add(PatientTreatment(patient_id=patient.id, treatment_id=treatment.id, prescribed_by=doctor.id, status="prescribed"))
+    db.session.commit()
+    doctor_id = doctor.id
+
+    response = client.delete(f'/api/doctors/{doctor_id}', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert PatientAssistant.query.filter_by(doctor_id=doctor_id).count() == 0
+    remaining = PatientTreatment.query.filter_by(patient_id=patient.id).one()
+    assert remaining.prescribed_by is None
@@ -66,3 +66,167 @@ def test_delete_patient_unauthorized(client, patient):
     assert patient is not None, "Patient fixture returned None"
     response = client.delete(f'/api/patients/{patient.id}')
     assert response.status_code == 401
+
+def test_get_all_patients_keyset_pagination(client, auth_headers_manager):
+    for i in range(5):
+        client.post('/api/patients/register', headers=auth_headers_manager, json={"name": f"paged_patient_{i}"})
+
+    response = client.get('/api/patients/?limit=2', headers=auth_headers_manager)
+    assert response.status_code == 200
+    names = [p["name"] for p in response.json["patients"]]
+    cursor = response.json["next_cursor"]
+    while cursor is not None:
+        response = client.get(f'/api/patients/?limit=2&after={cursor}', headers=auth_headers_manager)
+        names += [p["name"] for p in response.json["patients"]]
+        cursor = response.json["next_cursor"]
+    assert names == [f"paged_patient_{i}" for i in range(5)]
+
+def test_get_all_patients_invalid_limit(client, auth_headers_manager, patient):
+    response = client.get('/api/patients/?limit=0', headers=auth_headers_manager)
+    assert response.status_code == 400
+
+def test_search_patients_prefix_case_insensitive(client, auth_headers_manager):
+    for name in ("Anna Smith", "anna karenina", "Bob Annan", "Ann"):
+        client.post('/api/patients/register', headers=auth_headers_manager, json={"name": name})
+
+    response = client.get('/api/patients/search?q=ann&limit=2', headers=auth_headers_manager)
+    assert response.status_code == 200
+    names = [p["name"] for p in response.json["patients"]]
+    assert names[0] == "Ann"
+    assert len(names) == 2
+    assert all(n.lower().startswith("ann") for n in names)
+
+def test_search_patients_escapes_wildcards(client, auth_headers_manager, patient):
+    response = client.get('/api/patients/search?q=%25', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert response.json["patients"] == []
+
+    response = client.get('/api/patients/search', headers=auth_headers_manager)
+    assert response.status_code == 400
+
+def test_bulk_register_patients(client, auth_headers_manager, patient):
+    response = client.post('/api/patients/bulk', headers=auth_headers_manager, json={
+        "patients": [{"name": "bulk_1"}, {"name": "patient1"}, {"name": "bulk_1"}, {}, {"name": "bulk_2"}]
+    })
+    assert response.status_code == 201
+    assert response.json["created"] == 2
+    statuses = [r["status"] for r in response.json["results"]]
+    assert statuses == ["created", "duplicate", "duplicate", "invalid", "created"]
+    assert all(r["id"] for r in response.json["results"] if r["status"] == "created")
+
+def test_bulk_register_patients_names_are_case_insensitive(client, auth_headers_manager):
+    response = client.post('/api/patients/bulk', headers=auth_headers_manager, json={
+        "patients": [{"name": "alice"}, {"name": "Alice"}]
+    })
+    assert response.status_code == 201
+    assert [r["status"] for r in response.json["results"]] == ["created", "duplicate"]
+
+def test_bulk_register_patients_requires_list(client, auth_headers_manager):
+    response = client.post('/api/patients/bulk', headers=auth_headers_manager, json={"patients": []})
+    assert response.status_code == 400
+
+def test_bulk_assign_patients(app, client, auth_headers_doctor, doctor, assistant, patient):
+    from app import db
+    from app.models import Patient, PatientAssistant, User
+
+    other_doctor = User(name="doctor2", password_hash="x", role="Doctor")
+    owned = Patient(name="owned_by_other")
+    free = Patient(name="free_patient")
+    db.session.add_all([other_doctor, owned, free])
+    db.session.flush()
+    db.session.add(PatientAssistant(patient_id=owned.id, assistant_id=assistant.id, doctor_id=other_doctor.id))
+    db.session.commit()
+
+    response = client.post('/api/patients/assign/bulk', headers=auth_headers_doctor, json={"assignments": [
+        {"patient_id": patient.id, "assistant_id": assistant.id},
+        {"patient_id": free.id, "assistant_id": assistant.id},
+        {"patient_id": patient.id, "assistant_id": assistant.id},
+        {"patient_id": owned.id, "assistant_id": assistant.id},
+        {"patient_id": patient.id, "assistant_id": doctor.id},
+        {"patient_id": 9999, "assistant_id": assistant.id},
+    ]})
+    assert response.status_code == 201
+    assert response.json["assigned"] == 2
+    statuses = [r["status"] for r in response.json["results"]]
+    assert statuses == ["assigned", "assigned", "already_assigned", "conflict", "invalid", "not_found"]
+    assert PatientAssistant.query.filter_by(doctor_id=doctor.id).count() == 2
+
+def test_get_patients_by_doctor_paginated(app, client, auth_headers_manager, doctor, assistant, patient, doctor_assistant_patient_association):
+    from app import db
+    from app.models import User, PatientAssistant
+
+    second_assistant = User(name="assistant2", password_hash="x", role="Assistant")
+    db.session.add(second_assistant)
+    db.session.flush()
+    db.session.add(PatientAssistant(patient_id=patient.id, assistant_id=second_assistant.id, doctor_id=doctor.id))
+    db.session.commit()
+
+    response = client.get(f'/api/patients/doctor/patients?doctor_id={doctor.id}&limit=10', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert response.json["patients"] == [{"id": patient.id, "name": "patient1"}]
+    assert response.json["next_cursor"] is None
+
+def test_get_patients_by_doctor_requires_doctor_id(client, auth_headers_manager):
+    response = client.get('/api/patients/doctor/patients', headers=auth_headers_manager)
+    assert response.status_code == 400
+
+    # The JSON body fallback is type-checked too.
+    for body in [[1], {"doctor_id": "1"}, {"doctor_id": {"id": 1}}, {"doctor_id": True}]:
+        response = client.get('/api/patients/doctor/patients', headers=auth_headers_manager, json=body)
+        assert response.status_code == 400
+
+def _add_patient_with_dependents(doctor, assistant, treatment, count):
+    from app import db
+    from app.models import Patient, PatientTreatment, TreatmentLog
+    from sqlalchemy import insert
+
+    target = Patient(name=f"dependents_{count}")
+    db.session.add(target)
+    db.session.commit()
+    db.session.execute(insert(PatientTreatment), [
+        {"patient_id": target.id, "treatment_id": treatment.id, "prescribed_by": doctor.id, "status": "prescribed"}
+        for _ in range(count)
+    ])
+    db.session.execute(insert(TreatmentLog), [
+        {"patient_id": target.id, "treatment_id": treatment.id, "applied_by": assistant.id}
+        for _ in range(count)
+    ])
+    db.session.commit()
+    return target.id
+
+def test_delete_patient_removes_dependents(app, client, auth_headers_manager, doctor, assistant, treatment, doctor_assistant_patient_association, patient):
+    from app.models import PatientAssistant, PatientTreatment, TreatmentLog
+
+    patient_id = _add_patient_with_dependents(doctor, assistant, treatment, 5)
+    response = client.delete(f'/api/patients/{patient_id}', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert PatientTreatment.query.filter_by(patient_id=patient_id).count() == 0
+    assert TreatmentLog.query.filter_by(patient_id=patient_id).count() == 0
+
+    response = client.delete(f'/api/patients/{patient.id}', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert PatientAssistant.query.count() == 0
+
+def test_delete_patient_memory_is_flat(app, client, auth_headers_manager, doctor, assistant, treatment):
+    # Benchmark: peak Python memory of the delete must not grow with the number of dependent rows.
+    import tracemalloc
+    from app import db
+
+    peaks = {}
+    for count in (50, 5000):
+        patient_id = _add_patient_with_dependents(doctor, assistant, treatment, count)
+        db.session.expire_all()
+        tracemalloc.start()
+        response = client.delete(f'/api/patients/{patient_id}', headers=auth_headers_manager)
+        peaks[count] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert response.status_code == 200
+
+    assert peaks[5000] < peaks[50] * 2
+
+def test_bulk_assign_requires_integer_doctor_id(client, auth_headers_manager, patient, assistant):
+    assignments = [{"patient_id": patient.id, "assistant_id": assistant.id}]
+    for doctor_id in ["1", [1], True]:
+        response = client.post('/api/patients/assign/bulk', headers=auth_headers_manager, json={"assignments": assignments, "doctor_id": doctor_id})
+        assert response.status_code == 400
+        assert response.json["error"] == "doctor_id must be an integer"
@@ -22,3 +22,393 @@ def test_patient_treatment_report_unauthorized(client, patient_treatment_assosci
 def test_patient_treatment_report_forbidden(client, auth_headers_doctor, patient):
     response = client.get(f'/api/reports/patient-treatments/{patient.id}', headers=auth_headers_doctor)
     assert response.status_code == 403  # Doctor should be forbidden if they don’t supervise the patient
+
+def test_doctor_patient_report_query_count_is_constant(app, client, auth_headers_manager, assistant, patient):
+    from sqlalchemy import event
+    from app import db, report_cache
+    from app.models import User, Patient, PatientAssistant
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def add_doctors(start, stop):
+        for i in range(start, stop):
+            doctor = User(name=f"report_doctor_{i}", password_hash="x", role="Doctor")
+            extra_patient = Patient(name=f"report_patient_{i}")
+            db.session.add_all([doctor, extra_patient])
+            db.session.flush()
+            db.session.add(PatientAssistant(patient_id=extra_patient.id, assistant_id=assistant.id, doctor_id=doctor.id))
+            db.session.add(PatientAssistant(patient_id=patient.id, assistant_id=assistant.id, doctor_id=doctor.id))
+        db.session.commit()
+
+    # Warm-up request so per-worker state loaded on first use (revoked tokens) is not counted.
+    client.get('/api/reports/doctors-patients', headers=auth_headers_manager)
+
+    query_counts = []
+    created = 0
+    for total in (10, 100, 1000):
+        add_doctors(created, total)
+        created = total
+
+        report_cache.clear()
+        statements.clear()
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+        try:
+            response = client.get('/api/reports/doctors-patients', headers=auth_headers_manager)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+
+        assert response.status_code == 200
+        assert len(response.json["report"]) == total
+        assert all(len(entry["patients"]) == 2 for entry in response.json["report"])
+        assert response.json["statistics"]["total_patients"] == 2 * total
+        query_counts.append(len(statements))
+
+    assert query_counts[0] == query_counts[1] == query_counts[2]
+
+def test_report_statistics_follow_writes(app, client, auth_headers_manager, auth_headers_doctor, auth_headers_assistant, doctor, assistant, treatment):
+    from app.statistics import check_statistics
+
+    response = client.post('/api/patients/register', headers=auth_headers_manager, json={"name": "stats_patient"})
+    assert response.status_code == 201
+    patient_id = client.get('/api/patients/', headers=auth_headers_manager).json["patients"][0]["id"]
+
+    response = client.post(f'/api/patients/{patient_id}/assign', headers=auth_headers_doctor, json={"assistant_id": assistant.id})
+    assert response.status_code == 201
+    response = client.post(f'/api/treatments/{treatment.id}/prescribe/{patient_id}', headers=auth_headers_doctor)
+    assert response.status_code == 201
+    response = client.post(f'/api/treatments/{treatment.id}/apply/{patient_id}', headers=auth_headers_assistant)
+    assert response.status_code == 200
+
+    statistics = client.get('/api/reports/doctors-patients', headers=auth_headers_manager).json["statistics"]
+    assert statistics["best_used_treatments"] == [{"name": "Physical Therapy", "times_prescribed": 1}]
+    assert statistics["most_assigned_assistants"] == [{"name": "assistant1", "patients_assigned": 1}]
+    assert check_statistics() == []
+
+def test_report_statistics_after_patient_delete(client, auth_headers_manager, auth_headers_doctor, treatment, patient, doctor_assistant_patient_association):
+    response = client.post(f'/api/treatments/{treatment.id}/prescribe/{patient.id}', headers=auth_headers_doctor)
+    assert response.status_code == 201
+    statistics = client.get('/api/reports/doctors-patients', headers=auth_headers_manager).json["statistics"]
+    assert statistics["best_used_treatments"] == [{"name": "Physical Therapy", "times_prescribed": 1}]
+
+    response = client.delete(f'/api/patients/{patient.id}', headers=auth_headers_manager)
+    assert response.status_code == 200
+    statistics = client.get('/api/reports/doctors-patients', headers=auth_headers_manager).json["statistics"]
+    assert statistics["best_used_treatments"] == []
+    assert statistics["most_assigned_assistants"] == []
+
+def test_rebuild_statistics_command(app, patient_treatment_assosciation, doctor_assistant_patient_association):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['rebuild-statistics', '--check-only'])
+    assert result.exit_code == 1
+    assert "Drift" in result.output
+
+    result = runner.invoke(args=['rebuild-statistics'])
+    assert result.exit_code == 0
+    assert "Statistics rebuilt and verified." in result.output
+
+    result = runner.invoke(args=['rebuild-statistics', '--check-only'])
+    assert result.exit_code == 0
+
+def test_report_cache_invalidates_only_affected_reports(app, client, auth_headers_manager, auth_headers_assistant, doctor, assistant, treatment, patient, doctor_assistant_patient_association, patient_treatment_assosciation):
+    from app import db, report_cache
+    from app.models import Patient, PatientAssistant
+
+    other_patient = Patient(name="patient2")
+    db.session.add(other_patient)
+    db.session.flush()
+    db.session.add(PatientAssistant(patient_id=other_patient.id, assistant_id=assistant.id, doctor_id=doctor.id))
+    db.session.commit()
+    other_patient_id = other_patient.id
+
+    client.get('/api/reports/doctors-patients', headers=auth_headers_manager)
+    client.get(f'/api/reports/patient-treatments/{patient.id}', headers=auth_headers_manager)
+    client.get(f'/api/reports/patient-treatments/{other_patient_id}', headers=auth_headers_manager)
+    assert report_cache.stats()["misses"] == 3
+    assert report_cache.stats()["size"] == 3
+
+    response = client.post(f'/api/treatments/{treatment.id}/apply/{patient.id}', headers=auth_headers_assistant)
+    assert response.status_code == 200
+    assert report_cache.stats()["size"] == 1
+
+    client.get(f'/api/reports/patient-treatments/{other_patient_id}', headers=auth_headers_manager)
+    assert report_cache.stats()["hits"] == 1
+
+    response = client.get(f'/api/reports/patient-treatments/{patient.id}', headers=auth_headers_manager)
+    assert response.json["treatments"][0]["status"] == "applied"
+    assert report_cache.stats()["misses"] == 4
+
+    response = client.get('/api/reports/cache-stats', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert response.json["hits"] == 1
+
+def test_report_cache_lru_and_ttl():
+    from app.report_cache import ReportCache
+
+    cache = ReportCache()
+    cache.max_entries = 2
+    for key in ("a", "b", "a", "c"):
+        cache.get_or_set(key, lambda: (key, ()))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (1, 3, 1, 2)
+    assert cache.get_or_set("a", lambda: ("recomputed", ())) == "a"
+    assert cache.get_or_set("b", lambda: ("recomputed", ())) == "recomputed"
+
+    cache.ttl_seconds = 0
+    cache.get_or_set("d", lambda: ("d", ()))
+    assert cache.get_or_set("d", lambda: ("fresh", ())) == "fresh"
+    assert cache.stats()["expirations"] == 1
+
+def wait_for_report_job(client, headers, job_id):
+    import time
+    for _ in range(100):
+        response = client.get(f'/api/reports/doctors-patients/jobs/{job_id}', headers=headers)
+        if response.json["status"] in ("completed", "failed"):
+            return response
+        time.sleep(0.05)
+    raise AssertionError("report job did not finish")
+
+def test_doctor_patient_report_job(client, auth_headers_manager, doctor_assistant_patient_association):
+    response = client.post('/api/reports/doctors-patients/jobs', headers=auth_headers_manager)
+    assert response.status_code == 202
+    job_id = response.json["job_id"]
+
+    response = wait_for_report_job(client, auth_headers_manager, job_id)
+    assert response.status_code == 200
+    assert response.json["status"] == "completed"
+    expected = client.get('/api/reports/doctors-patients', headers=auth_headers_manager).json
+    assert response.json["result"] == expected
+
+def test_doctor_patient_report_job_unknown_and_unauthorized(client, auth_headers_manager, auth_headers_doctor):
+    response = client.get('/api/reports/doctors-patients/jobs/unknown', headers=auth_headers_manager)
+    assert response.status_code == 404
+    response = client.post('/api/reports/doctors-patients/jobs', headers=auth_headers_doctor)
+    assert response.status_code == 401
+
+def test_doctor_patient_report_ndjson(client, auth_headers_manager, doctor_assistant_patient_association):
+    expected = client.get('/api/reports/doctors-patients', headers=auth_headers_manager).json
+
+    response = client.get('/api/reports/doctors-patients?format=ndjson', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert lines[:-1] == expected["report"]
+    assert lines[-1] == {"statistics": expected["statistics"]}
+
+def test_doctor_patient_report_csv(client, auth_headers_manager, doctor, patient, doctor_assistant_patient_association):
+    response = client.get('/api/reports/doctors-patients?format=csv', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = response.data.decode().splitlines()
+    assert rows[0] == "doctor_id,doctor_name,patient_id,patient_name"
+    assert rows[1:] == [f"{doctor.id},doctor1,{patient.id},patient1"]
+
+def test_doctor_patient_report_invalid_format(client, auth_headers_manager, doctor):
+    response = client.get('/api/reports/doctors-patients?format=xml', headers=auth_headers_manager)
+    assert response.status_code == 400
+
+def test_apply_latency_distribution(app, client, auth_headers_manager, doctor, assistant, patient, treatment):
+    import datetime
+    from app import db
+    from app.models import PatientTreatment, PatientTreatmentArchive
+
+    start = datetime.datetime(2025, 1, 1, 8, 0, 0)
+    for hours in (1, 2):
+        db.session.add(PatientTreatment(
+            patient_id=patient.id, treatment_id=treatment.id, prescribed_by=doctor.id, applied_by=assistant.id,
+            prescribed_at=start, applied_at=start + datetime.timedelta(hours=hours), status='applied'
+        ))
+    # Archived rows are part of the distribution.
+    db.session.add(PatientTreatmentArchive(
+        id=1000, patient_id=patient.id, treatment_id=treatment.id, prescribed_by=doctor.id, applied_by=assistant.id,
+        prescribed_at=start, applied_at=start + datetime.timedelta(hours=10)
+    ))
+    db.session.add(PatientTreatment(patient_id=patient.id, treatment_id=treatment.id, prescribed_by=doctor.id, prescribed_at=start))
+    db.session.commit()
+
+    response = client.get('/api/reports/apply-latency?group_by=assistant&bins=0,4,24', headers=auth_headers_manager)
+    assert response.status_code == 200
+    overall = response.json["overall"]
+    assert overall["count"] == 3
+    assert overall["mean_hours"] == 4.33
+    assert abs(overall["p50_hours"] - 2) < 0.1
+    assert [b["count"] for b in overall["histogram"]] == [2, 1, 0]
+    assert response.json["groups"][0]["assistant_id"] == assistant.id
+    assert response.json["groups"][0]["count"] == 3
+
+def test_apply_latency_distribution_invalid_group(client, auth_headers_manager):
+    response = client.get('/api/reports/apply-latency?group_by=ward', headers=auth_headers_manager)
+    assert response.status_code == 400
+
+def test_apply_latency_distribution_rejects_non_finite_bins(client, auth_headers_manager):
+    for bins in ['0,nan', 'inf', '1,-inf']:
+        response = client.get(f'/api/reports/apply-latency?bins={bins}', headers=auth_headers_manager)
+        assert response.status_code == 400
+
+def test_patient_treatments_report_sparse_fields(app, client, auth_headers_manager, patient_treatment_assosciation):
+    from sqlalchemy import event
+    from app import db
+
+    statements = []
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.get(f'/api/reports/patient-treatments/{patient_treatment_assosciation.patient_id}?fields=name,status', headers=auth_headers_manager)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_statement)
+
+    assert response.status_code == 200
+    assert response.json["treatments"] == [{"id": patient_treatment_assosciation.treatment_id, "name": "Physical Therapy", "status": "prescribed"}]
+    assert not any("description" in statement for statement in statements)
+
+def test_patient_treatments_report_unknown_field(client, auth_headers_manager, patient):
+    response = client.get(f'/api/reports/patient-treatments/{patient.id}?fields=name,secret', headers=auth_headers_manager)
+    assert response.status_code == 400
+
+def test_treatment_logs_range_query(app, client, auth_headers_manager, assistant, patient, treatment):
+    import datetime
+    from app import db
+    from app.models import Patient, TreatmentLog
+
+    other_patient = Patient(name="other")
+    db.session.add(other_patient)
+    db.session.flush()
+    db.session.add_all([
+        TreatmentLog(patient_id=patient.id, treatment_id=treatment.id, applied_by=assistant.id, applied_at=datetime.datetime(2025, 1, 10), notes="long notes"),
+        TreatmentLog(patient_id=patient.id, treatment_id=treatment.id, applied_by=assistant.id, applied_at=datetime.datetime(2025, 2, 10)),
+        TreatmentLog(patient_id=patient.id, treatment_id=treatment.id, applied_by=None, applied_at=datetime.datetime(2025, 2, 11)),
+        TreatmentLog(patient_id=other_patient.id, treatment_id=treatment.id, applied_by=assistant.id, applied_at=datetime.datetime(2025, 2, 12)),
+    ])
+    db.session.commit()
+
+    response = client.get(
+        f'/api/reports/treatment-logs?patient_id={patient.id}&assistant_id={assistant.id}&from=2025-02-01&to=2025-03-01',
+        headers=auth_headers_manager
+    )
+    assert response.status_code == 200
+    assert [log["applied_at"] for log in response.json["logs"]] == ["2025-02-10 00:00:00"]
+
+    response = client.get('/api/reports/treatment-logs?from=2025-01-01&fields=applied_at&limit=2', headers=auth_headers_manager)
+    assert set(response.json["logs"][0]) == {"id", "applied_at"}
+    assert len(response.json["logs"]) == 2
+    assert [log["applied_at"] for log in response.json["logs"]] == ["2025-01-10 00:00:00", "2025-02-10 00:00:00"]
+    response = client.get(f'/api/reports/treatment-logs?from=2025-01-01&fields=applied_at&limit=2&after={response.json["next_cursor"]}', headers=auth_headers_manager)
+    assert [log["applied_at"] for log in response.json["logs"]] == ["2025-02-11 00:00:00", "2025-02-12 00:00:00"]
+    assert response.json["next_cursor"] is None
+
+def test_treatment_logs_pages_follow_applied_at_then_id(app, client, auth_headers_manager, patient, treatment):
+    import datetime
+    from app import db
+    from app.models import TreatmentLog
+
+    # Ids in the opposite order of applied_at, and ties on applied_at broken by id.
+    times = [datetime.datetime(2025, 3, 3), datetime.datetime(2025, 3, 2), datetime.datetime(2025, 3, 2), datetime.datetime(2025, 3, 1)]
+    logs = [TreatmentLog(patient_id=patient.id, treatment_id=treatment.id, applied_at=time) for time in times]
+    db.session.add_all(logs)
+    db.session.commit()
+    expected = [logs[3].id, logs[1].id, logs[2].id, logs[0].id]
+
+    seen, after = [], None
+    while True:
+        url = f'/api/reports/treatment-logs?patient_id={patient.id}&limit=1' + (f'&after={after}' if after else '')
+        response = client.get(url, headers=auth_headers_manager)
+        assert response.status_code == 200
+        seen += [log["id"] for log in response.json["logs"]]
+        after = response.json["next_cursor"]
+        if after is None:
+            break
+    assert seen == expected
+
+    response = client.get('/api/reports/treatment-logs?after=12', headers=auth_headers_manager)
+    assert response.status_code == 400
+
+def test_treatment_logs_range_query_invalid_window(client, auth_headers_manager):
+    response = client.get('/api/reports/treatment-logs?from=2025-03-01&to=2025-02-01', headers=auth_headers_manager)
+    assert response.status_code == 400
+    response = client.get('/api/reports/treatment-logs?from=yesterday', headers=auth_headers_manager)
+    assert response.status_code == 400
+
+def test_partition_treatment_logs_requires_mysql(app):
+    from app import db
+    if db.engine.dialect.name == 'mysql':
+        pytest.skip('only checks the guard on other databases')
+    result = app.test_cli_runner().invoke(args=['partition-treatment-logs'])
+    assert result.exit_code != 0
+    assert 'only supported on MySQL' in result.output
+
+def test_archive_applied_patient_treatments(app, client, auth_headers_manager, doctor, assistant, patient, treatment):
+    import datetime
+    from app import db
+    from app.models import Treatment, PatientTreatment, PatientTreatmentArchive
+    from app.statistics import check_statistics, rebuild_statistics
+
+    recent = Treatment(name="Recent", description="d")
+    pending = Treatment(name="Pending", description="d")
+    db.session.add_all([recent, pending])
+    db.session.flush()
+    long_ago = datetime.datetime.now() - datetime.timedelta(days=400)
+    db.session.add_all([
+        PatientTreatment(patient_id=patient.id, treatment_id=treatment.id, prescribed_by=doctor.id, applied_by=assistant.id,
+                         prescribed_at=long_ago - datetime.timedelta(hours=5), applied_at=long_ago, status="applied"),
+        PatientTreatment(patient_id=patient.id, treatment_id=recent.id, prescribed_by=doctor.id, applied_by=assistant.id,
+                         prescribed_at=datetime.datetime.now(), applied_at=datetime.datetime.now(), status="applied"),
+        PatientTreatment(patient_id=patient.id, treatment_id=pending.id, prescribed_by=doctor.id,
+                         prescribed_at=long_ago, status="prescribed"),
+    ])
+    db.session.commit()
+    rebuild_statistics()
+
+    result = app.test_cli_runner().invoke(args=['archive-patient-treatments', '--older-than-days', '180', '--batch-size', '1'])
+    assert result.exit_code == 0
+    assert '1 patient treatment(s) archived.' in result.output
+    assert PatientTreatment.query.count() == 2
+    assert PatientTreatmentArchive.query.one().treatment_id == treatment.id
+    # Archiving moves rows without changing what the statistics count.
+    assert check_statistics() == []
+
+    response = client.get(f'/api/reports/patient-treatments/{patient.id}', headers=auth_headers_manager)
+    assert sorted(t["name"] for t in response.json["treatments"]) == ["Pending", "Recent"]
+    response = client.get(f'/api/reports/patient-treatments/{patient.id}?include_archived=true&fields=name,archived', headers=auth_headers_manager)
+    assert sorted((t["name"], t["archived"]) for t in response.json["treatments"]) == [
+        ("Pending", False), ("Physical Therapy", True), ("Recent", False)
+    ]
+
+    response = client.delete(f'/api/patients/{patient.id}', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert PatientTreatmentArchive.query.count() == 0
+    assert check_statistics() == []
+
+def test_statistics_upsert_creates_then_adds(app, treatment):
+    from app import db, statistics
+    from app.models import TreatmentStatistic, ApplyLatencyStatistic
+
+    statistics.record_prescriptions({treatment.id: 2, None: 5})
+    statistics.record_prescriptions({treatment.id: 3})
+    statistics.record_apply_latency(10, 1, shard_key=1)
+    statistics.record_apply_latency(4, 2, shard_key=1)
+    statistics.record_apply_latency(6, 1, shard_key=2)
+    db.session.commit()
+    assert db.session.get(TreatmentStatistic, treatment.id).times_prescribed == 5
+    latency = db.session.get(ApplyLatencyStatistic, 1)
+    assert (latency.total_hours, latency.applied_count) == (14, 3)
+    assert ApplyLatencyStatistic.query.count() == 2
+    assert statistics.get_average_apply_hours() == 5
+
+def test_archived_report_creates_missing_view(app, client, auth_headers_manager, patient, monkeypatch):
+    from sqlalchemy import inspect, text
+    from app import db
+    from app.models import patient_treatment_archive
+
+    # A database built by migrations has the tables but not the view.
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP VIEW patient_treatments_all'))
+    monkeypatch.setattr(patient_treatment_archive, '_view_checked', False)
+
+    response = client.get(f'/api/reports/patient-treatments/{patient.id}?include_archived=true', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert 'patient_treatments_all' in inspect(db.engine).get_view_names()
@@ -82,3 +82,223 @@ def test_apply_treatment(client, auth_headers_assistant, treatment, patient, doc
 def test_apply_treatment_non_existent_patient(client, auth_headers_assistant, treatment):
     response = client.post(f'/api/treatments/{treatment.id}/apply/9999', headers=auth_headers_assistant)
     assert response.status_code == 404  # Patient not found
+
+def test_prescribe_treatments_bulk(app, client, auth_headers_doctor, doctor, treatment, patient, doctor_assistant_patient_association, patient_treatment_assosciation):
+    from app import db
+    from app.models import Patient, Treatment, PatientTreatment, TreatmentStatistic
+
+    second = Treatment(name="Massage", description="Relaxing massage.")
+    unsupervised = Patient(name="someone_else")
+    db.session.add_all([second, unsupervised])
+    db.session.commit()
+
+    response = client.post('/api/treatments/prescribe/bulk', headers=auth_headers_doctor, json={
+        "treatment_ids": [treatment.id, second.id, 9999],
+        "patient_ids": [patient.id, unsupervised.id, patient.id]
+    })
+    assert response.status_code == 201
+    assert response.json["prescribed"] == 1
+    statuses = [(r["patient_id"], r["treatment_id"], r["status"]) for r in response.json["results"]]
+    assert statuses == [
+        (patient.id, treatment.id, "already_prescribed"),
+        (patient.id, second.id, "prescribed"),
+        (patient.id, 9999, "not_found"),
+        (unsupervised.id, treatment.id, "forbidden"),
+        (unsupervised.id, second.id, "forbidden"),
+        (unsupervised.id, 9999, "forbidden"),
+    ]
+    assert PatientTreatment.query.filter_by(patient_id=patient.id).count() == 2
+    assert db.session.get(TreatmentStatistic, second.id).times_prescribed == 1
+
+    # true/false are not ids.
+    response = client.post('/api/treatments/prescribe/bulk', headers=auth_headers_doctor, json={
+        "treatment_ids": [True], "patient_ids": [patient.id]
+    })
+    assert response.status_code == 400
+
+def test_prescribe_treatments_bulk_requires_doctor(client, auth_headers_assistant, treatment, patient):
+    response = client.post('/api/treatments/prescribe/bulk', headers=auth_headers_assistant, json={
+        "treatment_ids": [treatment.id], "patient_ids": [patient.id]
+    })
+    assert response.status_code == 401
+
+def test_apply_treatments_bulk(app, client, auth_headers_assistant, doctor, treatment, patient, doctor_assistant_patient_association, patient_treatment_assosciation):
+    from app import db
+    from app.models import Patient, PatientTreatment, TreatmentLog
+
+    other_patient = Patient(name="not_assigned")
+    db.session.add(other_patient)
+    db.session.commit()
+
+    response = client.post('/api/treatments/apply/bulk', headers=auth_headers_assistant, json={"applications": [
+        {"patient_id": patient.id, "treatment_id": treatment.id},
+        {"patient_id": patient.id, "treatment_id": treatment.id},
+        {"patient_id": patient.id, "treatment_id": 9999},
+        {"patient_id": other_patient.id, "treatment_id": treatment.id},
+        {"patient_id": "x"},
+    ]})
+    assert response.status_code == 200
+    assert response.json["applied"] == 1
+    statuses = [r["status"] for r in response.json["results"]]
+    assert statuses == ["applied", "already_applied", "not_found", "forbidden", "invalid"]
+
+    db.session.expire_all()
+    applied = PatientTreatment.query.filter_by(patient_id=patient.id).one()
+    assert applied.status == "applied"
+    assert applied.applied_by == doctor_assistant_patient_association.assistant_id
+    assert TreatmentLog.query.filter_by(patient_id=patient.id).count() == 1
+
+def test_apply_treatments_bulk_requires_assistant(client, auth_headers_doctor, treatment, patient):
+    response = client.post('/api/treatments/apply/bulk', headers=auth_headers_doctor, json={
+        "applications": [{"patient_id": patient.id, "treatment_id": treatment.id}]
+    })
+    assert response.status_code == 403
+
+def test_apply_treatment_concurrent_requests(app, client, auth_headers_assistant, treatment, patient, doctor_assistant_patient_association, patient_treatment_assosciation):
+    # N assistants' requests race for the same prescription: exactly one applies it, the others
+    # are rejected without writing a log, and the whole burst completes quickly.
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.models import TreatmentLog
+
+    workers = 8
+
+    def apply_once(_):
+        with app.test_client() as worker_client:
+            return worker_client.post(f'/api/treatments/{treatment.id}/apply/{patient.id}', headers=auth_headers_assistant).status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(apply_once, range(workers)))
+    elapsed = time.perf_counter() - started
+
+    assert statuses.count(200) == 1
+    assert statuses.count(400) == workers - 1
+    assert TreatmentLog.query.filter_by(patient_id=patient.id, treatment_id=treatment.id).count() == 1
+    assert elapsed < 5
+
+def test_treatment_catalog_cache_reloads_only_on_version_change(app, client, auth_headers_manager, treatment):
+    from app import db, treatment_catalog
+    from app.models import Treatment
+    from app.treatment_catalog import TREATMENT_CATALOG
+    from app.models import CatalogVersion
+
+    treatment_catalog.invalidate()
+    treatment_catalog.reset_stats()
+    for _ in range(3):
+        response = client.get(f'/api/treatments/{treatment.id}', headers=auth_headers_manager)
+        assert response.json["name"] == "Physical Therapy"
+    stats = treatment_catalog.stats()
+    assert stats["reloads"] == 1
+    assert stats["version_checks"] == 3
+
+    # Another worker renames the treatment and bumps the version: this worker sees it on the next check.
+    Treatment.query.filter_by(id=treatment.id).update({'name': 'Renamed'})
+    db.session.merge(CatalogVersion(name=TREATMENT_CATALOG, version=treatment_catalog.stats()["version"] + 1))
+    db.session.commit()
+    response = client.get(f'/api/treatments/{treatment.id}', headers=auth_headers_manager)
+    assert response.json["name"] == "Renamed"
+    assert treatment_catalog.stats()["reloads"] == 2
+
+def test_treatment_catalog_bump_creates_then_increments_version(app):
+    from app import db, treatment_catalog
+    from app.models import CatalogVersion
+    from app.treatment_catalog import TREATMENT_CATALOG
+
+    treatment_catalog.bump()
+    treatment_catalog.bump()
+    db.session.commit()
+    assert db.session.get(CatalogVersion, TREATMENT_CATALOG).version == 2
+
+def test_treatment_catalog_sees_local_writes(client, auth_headers_manager, treatment):
+    client.get('/api/treatments/', headers=auth_headers_manager)
+    response = client.post('/api/treatments/register', headers=auth_headers_manager, json={"name": "Massage", "description": "Relaxing massage."})
+    assert response.status_code == 201
+
+    response = client.get('/api/treatments/?limit=1', headers=auth_headers_manager)
+    assert [t["name"] for t in response.json["treatments"]] == ["Physical Therapy"]
+    response = client.get(f'/api/treatments/?limit=1&after={response.json["next_cursor"]}', headers=auth_headers_manager)
+    assert [t["name"] for t in response.json["treatments"]] == ["Massage"]
+    assert response.json["next_cursor"] is None
+
+    client.delete(f'/api/treatments/{treatment.id}', headers=auth_headers_manager)
+    assert client.get(f'/api/treatments/{treatment.id}', headers=auth_headers_manager).status_code == 404
+
+def test_get_all_treatments_sparse_fields(app, client, auth_headers_manager, treatment):
+    from app import treatment_catalog
+
+    response = client.get('/api/treatments/?fields=name', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert response.json["treatments"] == [{"id": treatment.id, "name": "Physical Therapy"}]
+
+    # Without the catalog cache the description column is left out of the SELECT.
+    from sqlalchemy import event
+    from app import db
+    statements = []
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    treatment_catalog.enabled = False
+    event.listen(db.engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.get('/api/treatments/?fields=name', headers=auth_headers_manager)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_statement)
+        treatment_catalog.enabled = True
+    assert response.json["treatments"] == [{"id": treatment.id, "name": "Physical Therapy"}]
+    assert not any("description" in statement for statement in statements)
+
+    assert client.get('/api/treatments/?fields=price', headers=auth_headers_manager).status_code == 400
+
+def test_buffered_treatment_log_writer(app, client, auth_headers_assistant, auth_headers_manager, treatment, patient, doctor_assistant_patient_association, patient_treatment_assosciation):
+    from app import treatment_log_writer
+    from app.models import TreatmentLog
+
+    app.config.update(TREATMENT_LOG_BUFFER_ENABLED=True, TREATMENT_LOG_FLUSH_ENTRIES=100, TREATMENT_LOG_FLUSH_INTERVAL_MS=60000)
+    treatment_log_writer.init_app(app)
+    try:
+        response = client.post(f'/api/treatments/{treatment.id}/apply/{patient.id}', headers=auth_headers_assistant)
+        assert response.status_code == 200
+        # Rejected applies roll back and queue nothing.
+        response = client.post(f'/api/treatments/{treatment.id}/apply/{patient.id}', headers=auth_headers_assistant)
+        assert response.status_code == 400
+
+        assert TreatmentLog.query.count() == 0
+        stats = client.get('/api/reports/treatment-log-writer-stats', headers=auth_headers_manager).json
+        assert stats["enabled"] is True
+        assert stats["queue_depth"] == 1
+    finally:
+        treatment_log_writer.shutdown()
+
+    assert TreatmentLog.query.filter_by(patient_id=patient.id, treatment_id=treatment.id).count() == 1
+    stats = treatment_log_writer.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["flushed_entries"] == 1
+    assert stats["flushes"] == 1
+
+def test_buffered_treatment_log_writer_flushes_every_n_entries(app, client, auth_headers_assistant, patient, doctor_assistant_patient_association):
+    import time
+    from app import db, treatment_log_writer
+    from app.models import Treatment, PatientTreatment, TreatmentLog
+
+    treatments = [Treatment(name=f"t{i}", description="d") for i in range(4)]
+    db.session.add_all(treatments)
+    db.session.flush()
+    db.session.add_all([PatientTreatment(patient_id=patient.id, treatment_id=t.id) for t in treatments])
+    db.session.commit()
+
+    app.config.update(TREATMENT_LOG_BUFFER_ENABLED=True, TREATMENT_LOG_FLUSH_ENTRIES=4, TREATMENT_LOG_FLUSH_INTERVAL_MS=60000)
+    treatment_log_writer.init_app(app)
+    try:
+        response = client.post('/api/treatments/apply/bulk', headers=auth_headers_assistant, json={
+            "applications": [{"patient_id": patient.id, "treatment_id": t.id} for t in treatments]
+        })
+        assert response.json["applied"] == 4
+        deadline = time.monotonic() + 5
+        while treatment_log_writer.stats()["flushed_entries"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert treatment_log_writer.stats()["flushes"] == 1
+        db.session.expire_all()
+        assert TreatmentLog.query.count() == 4
+    finally:
+        treatment_log_writer.shutdown()
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import inspect
+from app import db
+from app.models import User
+from werkzeug.security import generate_password_hash
+
+@pytest.fixture
+def staff(app):
+    """Create a mix of doctors and assistants"""
+    names = [("Dr. Adams", "Doctor"), ("Dr. Baker", "Doctor"), ("Dr. Brown", "Doctor"), ("Betty Assistant", "Assistant")]
+    for name, role in names:
+        db.session.add(User(name=name, password_hash=generate_password_hash("password"), role=role))
+    db.session.commit()
+
+def test_get_users_by_role_and_name_prefix(client, auth_headers_manager, staff):
+    response = client.get('/api/users/?role=Doctor&name=Dr.%20B', headers=auth_headers_manager)
+    assert response.status_code == 200
+    assert [u["name"] for u in response.json["users"]] == ["Dr. Baker", "Dr. Brown"]
+    assert all(u["role"] == "Doctor" for u in response.json["users"])
+
+def test_get_users_keyset_pagination(client, auth_headers_manager, staff):
+    response = client.get('/api/users/?limit=2', headers=auth_headers_manager)
+    assert response.status_code == 200
+    first_page = [u["name"] for u in response.json["users"]]
+    assert first_page == ["Betty Assistant", "Dr. Adams"]
+
+    response = client.get(f'/api/users/?limit=2&after={response.json["next_cursor"]}', headers=auth_headers_manager)
+    assert [u["name"] for u in response.json["users"]] == ["Dr. Baker", "Dr. Brown"]
+
+    response = client.get(f'/api/users/?limit=2&after={response.json["next_cursor"]}', headers=auth_headers_manager)
+    assert [u["name"] for u in response.json["users"]] == ["manager"]
+    assert response.json["next_cursor"] is None
+
+def test_get_users_invalid_arguments(client, auth_headers_manager):
+    assert client.get('/api/users/?role=Nurse', headers=auth_headers_manager).status_code == 400
+    assert client.get('/api/users/?limit=0', headers=auth_headers_manager).status_code == 400
+    assert client.get('/api/users/?name=nobody', headers=auth_headers_manager).status_code == 204
+
+def test_get_users_unauthorized(client, auth_headers_doctor):
+    assert client.get('/api/users/', headers=auth_headers_doctor).status_code == 401
+
+def test_user_name_indexes_are_unique(app):
+    indexes = {index["name"]: index for index in inspect(db.engine).get_indexes("users")}
+    assert indexes["ix_users_name"]["column_names"] == ["name"] and indexes["ix_users_name"]["unique"]
+    assert indexes["ix_users_role_name"]["column_names"] == ["role", "name"] and indexes["ix_users_role_name"]["unique"]
+
+def test_update_user_to_existing_name(client, auth_headers_manager, doctor, assistant):
+    response = client.put(f'/api/doctors/{doctor.id}', headers=auth_headers_manager, json={"name": "assistant1"})
+    assert response.status_code == 400
+    assert response.json["error"] == "User with this name already exists"
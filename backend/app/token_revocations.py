@@ -0,0 +1,101 @@
+import datetime
+import threading
+import time
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+NO_EXPIRY = datetime.datetime(9999, 12, 31)
+
+class TokenRevocations:
+    # In-memory set of revoked JWT ids and per-user cutoffs ("tokens issued before"), checked on
+    # every authenticated request without touching the database. Both are reloaded from the
+    # unexpired rows of revoked_tokens and user_token_cutoffs at most every `refresh_seconds`, so
+    # revocations made by other workers apply within that delay whatever order their transactions
+    # commit in. The tables only hold unexpired rows, so they stay small.
+
+    def __init__(self, app=None):
+        self.refresh_seconds = 30
+        self.refresh_token_lifetime = datetime.timedelta(days=30)
+        self._revoked = {}  # jti -> expires_at
+        self._cutoffs = {}  # user id -> Unix time before which its tokens are rejected
+        self._synced_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.refresh_seconds = app.config.get('TOKEN_REVOCATION_REFRESH_SECONDS', self.refresh_seconds)
+        self.refresh_token_lifetime = app.config.get('JWT_REFRESH_TOKEN_EXPIRES', self.refresh_token_lifetime)
+        with self._lock:
+            self._revoked.clear()
+            self._cutoffs.clear()
+            self._synced_at = None
+
+    def is_revoked(self, jwt_header, jwt_payload):
+        # Flask-JWT-Extended token_in_blocklist_loader callback.
+        self._sync_if_due()
+        if jwt_payload['jti'] in self._revoked:
+            return True
+        identity = jwt_payload.get('sub')
+        cutoff = self._cutoffs.get(identity.get('id')) if isinstance(identity, dict) else None
+        return cutoff is not None and jwt_payload.get('iat', 0) <= cutoff
+
+    def revoke_user(self, user_id):
+        # Rejects every token issued to the user until now: call when the user is deleted or their
+        # role or password changes. Runs in the caller's transaction; the caller commits.
+        from app import db
+        from app.models import UserTokenCutoff
+        now = datetime.datetime.now().replace(microsecond=0)
+        values = {'user_id': user_id, 'not_before': now, 'expires_at': now + self.refresh_token_lifetime}
+        if db.engine.dialect.name == 'sqlite':
+            statement = sqlite_insert(UserTokenCutoff).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={'not_before': statement.excluded.not_before, 'expires_at': statement.excluded.expires_at}
+            )
+        else:
+            statement = mysql_insert(UserTokenCutoff).values(values)
+            statement = statement.on_duplicate_key_update(
+                not_before=statement.inserted.not_before, expires_at=statement.inserted.expires_at
+            )
+        db.session.execute(statement)
+        with self._lock:
+            # iat has whole seconds: tokens issued in this same second are rejected too.
+            self._cutoffs[user_id] = now.timestamp()
+
+    def revoke(self, jwt_payload):
+        from app import db
+        from app.models import RevokedToken
+        expires_at = datetime.datetime.fromtimestamp(jwt_payload['exp']) if 'exp' in jwt_payload else NO_EXPIRY
+        # Expired rows are no longer needed; the expires_at index keeps this cheap.
+        RevokedToken.query.filter(RevokedToken.expires_at < datetime.datetime.now()).delete(synchronize_session=False)
+        if not RevokedToken.query.filter_by(jti=jwt_payload['jti']).first():
+            db.session.add(RevokedToken(jti=jwt_payload['jti'], expires_at=expires_at))
+        db.session.commit()
+        with self._lock:
+            self._revoked[jwt_payload['jti']] = expires_at
+
+    def _sync_if_due(self):
+        from app import db
+        from app.models import RevokedToken, UserTokenCutoff
+        with self._lock:
+            if self._synced_at is not None and time.monotonic() - self._synced_at < self.refresh_seconds:
+                return
+
+        # A full reload rather than "rows with a higher id": ids are assigned before commit, so a
+        # revocation can become visible after rows with higher ids and would otherwise be missed.
+        now = datetime.datetime.now()
+        rows = (
+            db.session.query(RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.expires_at > now)
+            .all()
+        )
+        cutoffs = (
+            db.session.query(UserTokenCutoff.user_id, UserTokenCutoff.not_before)
+            .filter(UserTokenCutoff.expires_at > now)
+            .all()
+        )
+        with self._lock:
+            self._revoked = {row.jti: row.expires_at for row in rows}
+            self._cutoffs = {row.user_id: row.not_before.timestamp() for row in cutoffs}
+            self._synced_at = time.monotonic()
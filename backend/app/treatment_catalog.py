@@ -0,0 +1,129 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+
+TREATMENT_CATALOG = 'treatments'
+
+CachedTreatment = namedtuple('CachedTreatment', ['id', 'name', 'description'])
+
+class TreatmentCatalog:
+    # Per-process copy of the treatments table. Writers bump a version row in the same transaction
+    # as their change; readers compare it with the version they loaded (one primary key lookup) and
+    # reload the whole catalog only when it differs.
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.check_interval_seconds = 0
+        self._state = None  # (version, {id: CachedTreatment}, sorted ids)
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self.reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('TREATMENT_CATALOG_CACHE_ENABLED', self.enabled)
+        self.check_interval_seconds = app.config.get('TREATMENT_CATALOG_CHECK_SECONDS', self.check_interval_seconds)
+        self.invalidate()
+        self.reset_stats()
+
+    def get(self, treatment_id):
+        # Returns the CachedTreatment with this id, or None.
+        if not self.enabled:
+            from app import db
+            from app.models import Treatment
+            row = db.session.query(Treatment.id, Treatment.name, Treatment.description).filter(Treatment.id == treatment_id).first()
+            return CachedTreatment(*row) if row else None
+        return self._current()[1].get(treatment_id)
+
+    def existing_ids(self, treatment_ids):
+        if not self.enabled:
+            from app import db
+            from app.models import Treatment
+            return {treatment_id for (treatment_id,) in db.session.query(Treatment.id).filter(Treatment.id.in_(treatment_ids))}
+        by_id = self._current()[1]
+        return {treatment_id for treatment_id in treatment_ids if treatment_id in by_id}
+
+    def page(self, limit, after=None, fields=None):
+        # Same contract as utils.paginate_by_id: returns (rows, next_cursor). Without the cache only
+        # the requested fields are loaded; the other columns stay deferred.
+        if not self.enabled:
+            from app import db
+            from app.models import Treatment
+            from app.utils import paginate_by_id
+            query = Treatment.query
+            if fields:
+                query = query.options(db.load_only(*[getattr(Treatment, field) for field in fields]))
+            return paginate_by_id(query, Treatment.id, limit, after)
+        _, by_id, ids = self._current()
+        start = bisect_right(ids, after) if after is not None else 0
+        page_ids = ids[start:start + limit + 1]
+        rows = [by_id[treatment_id] for treatment_id in page_ids[:limit]]
+        return rows, (rows[-1].id if len(page_ids) > limit else None)
+
+    def bump(self):
+        # Call inside the transaction that creates, updates or deletes treatments, then
+        # invalidate() after the commit.
+        from app.models import CatalogVersion
+        from app.utils import add_or_insert
+        # Atomic upsert, so concurrent first edits cannot both insert the version row.
+        add_or_insert(CatalogVersion, ['name'], [{'name': TREATMENT_CATALOG, 'version': 1}])
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+
+    def reset_stats(self):
+        self.hits = 0
+        self.version_checks = 0
+        self.reloads = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'version': self._state[0] if self._state else None,
+                'size': len(self._state[1]) if self._state else 0,
+                'hits': self.hits,
+                'version_checks': self.version_checks,
+                'reloads': self.reloads
+            }
+
+    def _current(self):
+        with self._lock:
+            state = self._state
+            fresh = state is not None and time.monotonic() - self._checked_at < self.check_interval_seconds
+            if fresh:
+                self.hits += 1
+                return state
+
+        version = self._read_version()
+        with self._lock:
+            self.version_checks += 1
+            if self._state is not None and self._state[0] == version:
+                self._checked_at = time.monotonic()
+                self.hits += 1
+                return self._state
+
+        # The version is read before the rows, so a write committed in between only causes one
+        # extra reload on the next check.
+        state = self._load(version)
+        with self._lock:
+            self.reloads += 1
+            self._state = state
+            self._checked_at = time.monotonic()
+        return state
+
+    def _read_version(self):
+        from app import db
+        from app.models import CatalogVersion
+        version = db.session.query(CatalogVersion.version).filter(CatalogVersion.name == TREATMENT_CATALOG).scalar()
+        return version or 0
+
+    def _load(self, version):
+        from app import db
+        from app.models import Treatment
+        rows = db.session.query(Treatment.id, Treatment.name, Treatment.description).order_by(Treatment.id).all()
+        by_id = {row.id: CachedTreatment(row.id, row.name, row.description) for row in rows}
+        return version, by_id, [row.id for row in rows]
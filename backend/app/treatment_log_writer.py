@@ -0,0 +1,173 @@
+import atexit
+import threading
+import time
+from collections import deque
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+PENDING_KEY = 'treatment_log_entries'
+
+class TreatmentLogWriter:
+    # Write-behind writer for treatment_logs. When enabled, entries written in a request are queued
+    # once its transaction commits and a background thread inserts them in multi-row statements,
+    # every `flush_entries` entries or every `flush_interval_ms`, whichever comes first. When
+    # disabled (the default) or when the queue is full, entries are inserted in the caller's own
+    # transaction. Queued entries are flushed at shutdown; a crash loses at most one interval.
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.max_entries = 10000
+        self.flush_entries = 500
+        self.flush_interval_ms = 200
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._listening = False
+        self.reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.app = app
+        self.enabled = app.config.get('TREATMENT_LOG_BUFFER_ENABLED', self.enabled)
+        self.max_entries = app.config.get('TREATMENT_LOG_BUFFER_MAX_ENTRIES', self.max_entries)
+        self.flush_entries = app.config.get('TREATMENT_LOG_FLUSH_ENTRIES', self.flush_entries)
+        self.flush_interval_ms = app.config.get('TREATMENT_LOG_FLUSH_INTERVAL_MS', self.flush_interval_ms)
+        self.reset_stats()
+        if not self._listening:
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_rollback', self._after_rollback)
+            atexit.register(self.shutdown)
+            self._listening = True
+
+    def write(self, entries):
+        # entries: list of treatment_logs column dicts. Call inside the transaction that applies the
+        # treatments; buffered entries are only queued if that transaction commits.
+        from app import db
+        from app.models import TreatmentLog
+        if not entries:
+            return
+        if self.enabled:
+            with self._condition:
+                has_room = len(self._queue) + len(entries) <= self.max_entries
+            if has_room:
+                db.session.info.setdefault(PENDING_KEY, []).extend(entries)
+                return
+            self.direct_writes += len(entries)
+        db.session.execute(insert(TreatmentLog), entries)
+
+    def flush(self):
+        # Writes everything queued so far; returns the number of entries written.
+        written = 0
+        while True:
+            with self._condition:
+                batch = [self._queue.popleft() for _ in range(min(self.flush_entries, len(self._queue)))]
+            if not batch:
+                return written
+            written += self._write_batch(batch)
+
+    def shutdown(self):
+        # Stops the flush thread after it has written every queued entry.
+        thread = self._thread
+        if thread is not None:
+            with self._condition:
+                self._stopping = True
+                self._condition.notify()
+            thread.join()
+            self._thread = None
+            self._stopping = False
+        if self.app is not None and self._queue:
+            self.flush()
+
+    def reset_stats(self):
+        self.flushes = 0
+        self.flushed_entries = 0
+        self.failed_entries = 0
+        self.direct_writes = 0
+        self.last_flush_ms = 0
+        self.max_flush_ms = 0
+        self._total_flush_ms = 0
+
+    def stats(self):
+        with self._condition:
+            return {
+                'enabled': self.enabled,
+                'queue_depth': len(self._queue),
+                'max_entries': self.max_entries,
+                'flush_entries': self.flush_entries,
+                'flush_interval_ms': self.flush_interval_ms,
+                'flushes': self.flushes,
+                'flushed_entries': self.flushed_entries,
+                'failed_entries': self.failed_entries,
+                'direct_writes': self.direct_writes,
+                'last_flush_ms': round(self.last_flush_ms, 2),
+                'avg_flush_ms': round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0,
+                'max_flush_ms': round(self.max_flush_ms, 2)
+            }
+
+    def _after_commit(self, session):
+        entries = session.info.pop(PENDING_KEY, None)
+        if entries:
+            self._enqueue(entries)
+
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
+
+    def _enqueue(self, entries):
+        with self._condition:
+            self._queue.extend(entries)
+            if self._thread is None:
+                # Started on first use so forked workers each get their own thread.
+                self._thread = threading.Thread(target=self._run, name='treatment-log-writer', daemon=True)
+                self._thread.start()
+            if len(self._queue) >= self.flush_entries:
+                self._condition.notify()
+
+    def _run(self):
+        interval = self.flush_interval_ms / 1000
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopping or len(self._queue) >= self.flush_entries, timeout=interval
+                )
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def _write_batch(self, batch):
+        from app import db
+        from app.models import TreatmentLog
+        started = time.perf_counter()
+        written = 0
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(TreatmentLog), batch)
+                db.session.commit()
+                written = len(batch)
+            except Exception:
+                # One bad row (e.g. its patient was deleted meanwhile) must not lose the batch:
+                # retry row by row and drop only the rows that fail.
+                db.session.rollback()
+                for entry in batch:
+                    try:
+                        db.session.execute(insert(TreatmentLog), [entry])
+                        db.session.commit()
+                        written += 1
+                    except Exception:
+                        db.session.rollback()
+                        self.app.logger.exception('Dropping treatment log entry %s', entry)
+            finally:
+                db.session.remove()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._condition:
+            self.flushes += 1
+            self.flushed_entries += written
+            self.failed_entries += len(batch) - written
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+        return written
@@ -1,8 +1,11 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from flask_jwt_extended import get_jwt_identity
-from werkzeug.security import generate_password_hash
-from app.models import User, Patient, Treatment
-from app import db
+from sqlalchemy.dialects.mysql import match, insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import or_
+from app.models import User, Patient, Treatment, PatientAssistant, PatientTreatment, PatientTreatmentArchive, TreatmentLog, AssistantStatistic
+from app import db, password_hasher
+from app.password_hasher import PasswordHasherBusy
 
 def get_current_user():
     # Retrieves the current logged-in user from the JWT token.
@@ -26,16 +29,149 @@ def check_json():
         return jsonify({'error': 'Invalid data'}), 400
     return data
 
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+def get_limit_arg():
+    # Reads the page size ?limit= from the query string, for endpoints whose cursor is not an id.
+    # Returns (limit, error_response); error_response is None when the argument is valid.
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_LIMIT))
+    except ValueError:
+        return None, (jsonify({'error': 'limit must be an integer'}), 400)
+    if limit < 1 or limit > MAX_PAGE_LIMIT:
+        return None, (jsonify({'error': f'limit must be between 1 and {MAX_PAGE_LIMIT}'}), 400)
+    return limit, None
+
+def get_pagination_args():
+    # Reads the keyset pagination arguments ?limit=&after= from the query string.
+    # Returns (limit, after, error_response); error_response is None when the arguments are valid.
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_LIMIT))
+        after = int(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        return None, None, (jsonify({'error': 'limit and after must be integers'}), 400)
+    if limit < 1 or limit > MAX_PAGE_LIMIT:
+        return None, None, (jsonify({'error': f'limit must be between 1 and {MAX_PAGE_LIMIT}'}), 400)
+    return limit, after, None
+
+def paginate_by_name(query, name_column, limit, after):
+    # Keyset pagination on a unique name column: seeks past the name `after`. Returns
+    # (rows, next_cursor); next_cursor is the last name of the page, None on the last page.
+    if after is not None:
+        query = query.filter(name_column > after)
+    rows = query.order_by(name_column).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, getattr(rows[-1], name_column.key)
+    return rows, None
+
+def paginate_by_id(query, id_column, limit, after):
+    # Keyset pagination on the primary key: seeks past `after` instead of using OFFSET, so every
+    # page costs the same. Returns (rows, next_cursor); next_cursor is None on the last page.
+    if after is not None:
+        query = query.filter(id_column > after)
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].id
+    return rows, None
+
+def get_fields_arg(allowed, required=('id',)):
+    # Reads the sparse fieldset from ?fields=a,b. Returns (fields, error_response); fields keeps the
+    # order of `allowed`, always contains `required` and defaults to every allowed field.
+    raw = request.args.get('fields')
+    if raw is None:
+        return list(allowed), None
+    requested = {field.strip() for field in raw.split(',') if field.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        return None, (jsonify({'error': f'Unknown fields: {", ".join(sorted(unknown))}. Allowed fields: {", ".join(allowed)}'}), 400)
+    requested.update(required)
+    return [field for field in allowed if field in requested], None
+
+def chunked(items, size):
+    # Yields consecutive slices of at most `size` items.
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def add_or_insert(model, key_columns, rows):
+    # Adds the values of each row to the row with the same key, inserting it when there is none,
+    # in one atomic statement (INSERT ... ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT DO UPDATE
+    # on SQLite). Unlike "UPDATE, then INSERT if nothing matched", two concurrent first writes to
+    # the same key cannot both insert. rows: list of dicts with the key and value columns.
+    if not rows:
+        return
+    value_columns = [name for name in rows[0] if name not in key_columns]
+    if db.engine.dialect.name == 'sqlite':
+        statement = sqlite_insert(model).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={name: getattr(model, name) + statement.excluded[name] for name in value_columns}
+        )
+    else:
+        statement = mysql_insert(model).values(rows)
+        statement = statement.on_duplicate_key_update(
+            {name: getattr(model, name) + statement.inserted[name] for name in value_columns}
+        )
+    db.session.execute(statement)
+
+def get_bulk_items(key):
+    # Reads the list under `key` from a bulk request body.
+    # Returns (items, error_response); error_response is None when the list is valid.
+    data = check_json()
+    if isinstance(data, tuple):
+        return None, data
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({'error': f'{key} must be a non-empty list'}), 400)
+    max_items = current_app.config.get('BULK_MAX_ITEMS', 10000)
+    if len(items) > max_items:
+        return None, (jsonify({'error': f'At most {max_items} {key} can be sent in one request'}), 413)
+    return items, None
+
 def get_user_by_id(user_id):
     # Retrieves a user by their ID.
     return User.query.get(user_id)
 
+def delete_user_references(user_id):
+    # Removes or detaches every row referencing a user with set-based statements, mirroring the
+    # ON DELETE rules of the foreign keys, so deleting a user never loads its related rows.
+    # The caller deletes the user and commits. Tokens already issued to the user are revoked.
+    from app import statistics, token_revocations
+    token_revocations.revoke_user(user_id)
+    assignments = or_(PatientAssistant.assistant_id == user_id, PatientAssistant.doctor_id == user_id)
+    statistics.forget_patient_assistants(assignments)
+    PatientAssistant.query.filter(assignments).delete(synchronize_session=False)
+    AssistantStatistic.query.filter_by(assistant_id=user_id).delete(synchronize_session=False)
+    PatientTreatment.query.filter_by(prescribed_by=user_id).update({'prescribed_by': None}, synchronize_session=False)
+    PatientTreatment.query.filter_by(applied_by=user_id).update({'applied_by': None}, synchronize_session=False)
+    PatientTreatmentArchive.query.filter_by(prescribed_by=user_id).update({'prescribed_by': None}, synchronize_session=False)
+    PatientTreatmentArchive.query.filter_by(applied_by=user_id).update({'applied_by': None}, synchronize_session=False)
+    TreatmentLog.query.filter_by(applied_by=user_id).update({'applied_by': None}, synchronize_session=False)
+
+def hasher_busy_response():
+    # 503 returned when the password hashing pool is full (PasswordHasherBusy).
+    return jsonify({'error': 'Too many password operations in progress, retry shortly'}), 503, {'Retry-After': '1'}
+
 def update_user_fields(user, data):
     # Updates user fields based on the provided JSON data.
+    # Returns an error response when the new name belongs to another user or the hashing pool is
+    # full, None otherwise. Nothing is changed when an error is returned.
     if 'name' in data and data['name']:
-        user.name = data['name']
+        if User.query.filter(User.name == data['name'], User.id != user.id).first():
+            return jsonify({'error': 'User with this name already exists'}), 400
     if 'password' in data and data['password']:
-        user.password_hash = generate_password_hash(data['password'])
+        try:
+            user.password_hash = password_hasher.hash(data['password'])
+        except PasswordHasherBusy:
+            return hasher_busy_response()
+    if 'name' in data and data['name']:
+        user.name = data['name']
+    # Tokens carry the role and were granted with the old password: revoke them on either change.
+    if ('password' in data and data['password']) or ('role' in data and data['role'] and data['role'] != user.role):
+        from app import token_revocations
+        token_revocations.revoke_user(user.id)
     if 'role' in data and data['role']:
         user.role = data['role']
     db.session.commit()
@@ -46,6 +182,41 @@ def get_patient_by_id(patient_id):
         return None
     return patient
 
+def escape_like(value, escape_char='/'):
+    # Escapes LIKE wildcards so user input is matched literally (use with escape=escape_char).
+    return (
+        value.replace(escape_char, escape_char * 2)
+        .replace('%', escape_char + '%')
+        .replace('_', escape_char + '_')
+    )
+
+def search_patients_by_name(query, limit):
+    # Ranked, case-insensitive patient name search.
+    # 1. Prefix matches through the name index, in name order (an exact match sorts first).
+    # 2. On MySQL, remaining slots are filled with FULLTEXT (ngram) matches anywhere in the name,
+    #    ordered by relevance.
+    dialect = db.engine.dialect.name
+    name_order = Patient.name.collate('NOCASE') if dialect == 'sqlite' else Patient.name
+
+    prefix_matches = (
+        db.session.query(Patient.id, Patient.name)
+        .filter(Patient.name.like(escape_like(query) + '%', escape='/'))
+        .order_by(name_order, Patient.id)
+        .limit(limit)
+        .all()
+    )
+    results = [{'id': p.id, 'name': p.name, 'match': 'prefix'} for p in prefix_matches]
+
+    if len(results) < limit and dialect == 'mysql' and len(query) >= 2:
+        relevance = match(Patient.name, against=query).in_natural_language_mode()
+        fulltext_query = db.session.query(Patient.id, Patient.name).filter(relevance > 0)
+        if results:
+            fulltext_query = fulltext_query.filter(Patient.id.notin_([r['id'] for r in results]))
+        fulltext_matches = fulltext_query.order_by(relevance.desc()).limit(limit - len(results)).all()
+        results += [{'id': p.id, 'name': p.name, 'match': 'fulltext'} for p in fulltext_matches]
+
+    return results
+
 def get_treatment_by_id(treatment_id):
     #Retrieve a treatment by ID or return a 404 error.
     treatment = Treatment.query.get(treatment_id)
@@ -1,4 +1,5 @@
 import os
+import datetime
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,6 +7,53 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Per-worker cache of report payloads, invalidated by writes handled in the same worker.
+    REPORT_CACHE_ENABLED = os.getenv('REPORT_CACHE_ENABLED', 'true').lower() == 'true'
+    REPORT_CACHE_TTL_SECONDS = int(os.getenv('REPORT_CACHE_TTL_SECONDS', 30))
+    REPORT_CACHE_MAX_ENTRIES = int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 256))
+    # Limits for the bulk endpoints: max items per request and rows per INSERT statement.
+    BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 10000))
+    BULK_INSERT_CHUNK_SIZE = int(os.getenv('BULK_INSERT_CHUNK_SIZE', 1000))
+    # Per-worker copy of the treatments table. Each use checks the catalog version row (at most
+    # once per TREATMENT_CATALOG_CHECK_SECONDS) and reloads only when another worker changed it.
+    TREATMENT_CATALOG_CACHE_ENABLED = os.getenv('TREATMENT_CATALOG_CACHE_ENABLED', 'true').lower() == 'true'
+    TREATMENT_CATALOG_CHECK_SECONDS = float(os.getenv('TREATMENT_CATALOG_CHECK_SECONDS', 0))
+    # Opt-in write-behind buffer for treatment_logs: entries are queued after the request commits and
+    # inserted in batches every TREATMENT_LOG_FLUSH_ENTRIES entries or TREATMENT_LOG_FLUSH_INTERVAL_MS.
+    TREATMENT_LOG_BUFFER_ENABLED = os.getenv('TREATMENT_LOG_BUFFER_ENABLED', 'false').lower() == 'true'
+    TREATMENT_LOG_BUFFER_MAX_ENTRIES = int(os.getenv('TREATMENT_LOG_BUFFER_MAX_ENTRIES', 10000))
+    TREATMENT_LOG_FLUSH_ENTRIES = int(os.getenv('TREATMENT_LOG_FLUSH_ENTRIES', 500))
+    TREATMENT_LOG_FLUSH_INTERVAL_MS = int(os.getenv('TREATMENT_LOG_FLUSH_INTERVAL_MS', 200))
+    # `flask archive-patient-treatments` moves applied treatments older than this into the archive table.
+    PATIENT_TREATMENT_ARCHIVE_AFTER_DAYS = int(os.getenv('PATIENT_TREATMENT_ARCHIVE_AFTER_DAYS', 180))
+    PATIENT_TREATMENT_ARCHIVE_BATCH_SIZE = int(os.getenv('PATIENT_TREATMENT_ARCHIVE_BATCH_SIZE', 1000))
+    # Password hashing runs on a pool of PASSWORD_HASH_WORKERS processes (0 = inline on the request
+    # thread); at most PASSWORD_HASH_MAX_PENDING hashes wait or run at once, further logins get 503.
+    # Stored hashes made with other parameters are upgraded on the next successful login.
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_SALT_LENGTH = int(os.getenv('PASSWORD_HASH_SALT_LENGTH', 16))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64))
+    # Bulk imports hash on their own pool so they never delay logins (0 = inline on the importing thread).
+    PASSWORD_HASH_BULK_WORKERS = int(os.getenv('PASSWORD_HASH_BULK_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+    # Refresh tokens expire after this many hours (access tokens keep the 15 minute default).
+    JWT_REFRESH_TOKEN_EXPIRES = datetime.timedelta(hours=int(os.getenv('JWT_REFRESH_TOKEN_EXPIRES_HOURS', 24)))
+    # Revoked token ids are cached per worker; revocations made by other workers apply within this delay.
+    TOKEN_REVOCATION_REFRESH_SECONDS = int(os.getenv('TOKEN_REVOCATION_REFRESH_SECONDS', 30))
+    # Token-bucket login throttle, checked before the password hash: each username and each client
+    # address gets CAPACITY attempts refilled at REFILL_PER_SECOND. 'memory' keeps at most
+    # LOGIN_THROTTLE_MAX_KEYS buckets per worker; 'database' shares the buckets between workers.
+    LOGIN_THROTTLE_ENABLED = os.getenv('LOGIN_THROTTLE_ENABLED', 'true').lower() == 'true'
+    LOGIN_THROTTLE_BACKEND = os.getenv('LOGIN_THROTTLE_BACKEND', 'memory')
+    LOGIN_THROTTLE_USER_CAPACITY = int(os.getenv('LOGIN_THROTTLE_USER_CAPACITY', 5))
+    LOGIN_THROTTLE_USER_REFILL_PER_SECOND = float(os.getenv('LOGIN_THROTTLE_USER_REFILL_PER_SECOND', 0.1))
+    LOGIN_THROTTLE_ADDRESS_CAPACITY = int(os.getenv('LOGIN_THROTTLE_ADDRESS_CAPACITY', 50))
+    LOGIN_THROTTLE_ADDRESS_REFILL_PER_SECOND = float(os.getenv('LOGIN_THROTTLE_ADDRESS_REFILL_PER_SECOND', 1))
+    LOGIN_THROTTLE_MAX_KEYS = int(os.getenv('LOGIN_THROTTLE_MAX_KEYS', 100000))
+    # Background pool computing report jobs submitted through /api/reports/doctors-patients/jobs.
+    REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', 2))
+    REPORT_JOB_MAX_PENDING = int(os.getenv('REPORT_JOB_MAX_PENDING', 16))
+    REPORT_JOB_RESULT_TTL_SECONDS = int(os.getenv('REPORT_JOB_RESULT_TTL_SECONDS', 600))
 
 class DevelopmentConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI")
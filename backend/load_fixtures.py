@@ -1,7 +1,6 @@
 import json
-from app import db, create_app
+from app import db, create_app, password_hasher
 from app.models import User, Patient, Treatment, PatientTreatment, PatientAssistant
-from werkzeug.security import generate_password_hash
 
 app = create_app()
 
@@ -9,12 +8,16 @@ def load_fixtures():
     with app.app_context():
         with open("fixtures/sample_data_base_schema.json") as f:
             data = json.load(f)
+            # Hash every user's password in parallel on the hashing pool.
+            password_hashes = iter(password_hasher.hash_many(
+                [item["fields"]["password"] for item in data if item["model"] == "User"]
+            ))
             for item in data:
                 if item["model"] == "User":
                     user = User(
                         name=item["fields"]["name"],
                         role=item["fields"]["role"],
-                        password_hash=generate_password_hash(item["fields"]["password"])
+                        password_hash=next(password_hashes)
                     )
                     db.session.add(user)
                 elif item["model"] == "Patient":